@@ -0,0 +1,162 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pygame
+
+
+class AssetManager:
+    """
+    The AssetManager class decodes the images and sound effects under the assets directory on a thread pool
+    and keeps them, and every scaled copy asked for, for the rest of the run, so frame switches never go
+    back to the disk. Assets are preloaded at startup; one asked for before its turn is decoded on demand.
+    """
+    image_types = ('.png', '.jpg', '.jpeg', '.bmp')
+    sound_types = ('.wav', '.ogg')
+
+    def __init__(self, root='assets', workers=4):
+        """
+        Create an empty manager; nothing is read until scan, preload or an asset is asked for.
+        """
+        self.root = root
+        self.workers = workers
+        self.manifest = {}
+        self.pending = {}
+        self.surfaces = {}
+        self.converted = set()
+        self.scaled_surfaces = {}
+        self.sounds = {}
+        self.executor = None
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def key(path):
+        """
+        Return the cache key of a path, so 'assets/img/x.png' and './assets/img/x.png' share one entry.
+        """
+        return os.path.normpath(path)
+
+    def scan(self):
+        """
+        Build the manifest of every image and sound effect under root: path to (kind, size in bytes).
+        """
+        self.manifest = {}
+        for directory, _, files in os.walk(self.root):
+            for file in sorted(files):
+                path = self.key(os.path.join(directory, file))
+                extension = os.path.splitext(file)[1].lower()
+                if extension in self.image_types:
+                    self.manifest[path] = ('image', os.path.getsize(path))
+                elif extension in self.sound_types:
+                    self.manifest[path] = ('sound', os.path.getsize(path))
+        return self.manifest
+
+    def preload(self, paths=None):
+        """
+        Start decoding paths, by default the whole manifest, on the thread pool, largest files first so the
+        slowest decodes overlap the most. Sounds are skipped while the mixer is off.
+        """
+        if not self.manifest:
+            self.scan()
+        if paths is None:
+            paths = sorted(self.manifest, key=lambda path: -self.manifest[path][1])
+        with self.lock:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='asset-loader')
+            for path in map(self.key, paths):
+                if path in self.pending or path in self.surfaces or path in self.sounds:
+                    continue
+                if self.kind(path) == 'sound' and not pygame.mixer.get_init():
+                    continue
+                self.pending[path] = self.executor.submit(self.decode, path)
+
+    def kind(self, path):
+        """
+        Return 'image' or 'sound' for a path, from the manifest or its extension.
+        """
+        if path in self.manifest:
+            return self.manifest[path][0]
+        return 'sound' if os.path.splitext(path)[1].lower() in self.sound_types else 'image'
+
+    def decode(self, path):
+        """
+        Read one asset from disk. Images are converted to the display format when a display is already set.
+        """
+        if self.kind(path) == 'sound':
+            return pygame.mixer.Sound(path)
+        surface = pygame.image.load(path)
+        if pygame.display.get_surface() is not None:
+            surface = self.convert(surface)
+            self.converted.add(path)
+        return surface
+
+    @staticmethod
+    def convert(surface):
+        """
+        Return a copy of surface in the display format, keeping per-pixel alpha when it has any.
+        """
+        return surface.convert_alpha() if surface.get_flags() & pygame.SRCALPHA else surface.convert()
+
+    def collect(self, path):
+        """
+        Return a decoded asset, waiting for its pending decode or decoding it now when it was never queued.
+        """
+        path = self.key(path)
+        cache = self.sounds if self.kind(path) == 'sound' else self.surfaces
+        asset = cache.get(path)
+        if asset is None:
+            with self.lock:
+                future = self.pending.pop(path, None)
+            asset = future.result() if future is not None else self.decode(path)
+            cache[path] = asset
+        return asset
+
+    def image(self, path):
+        """
+        Return the decoded surface of an image, in the display format once a display is set.
+        """
+        surface = self.collect(path)
+        path = self.key(path)
+        if path not in self.converted and pygame.display.get_surface() is not None:
+            surface = self.surfaces[path] = self.convert(surface)
+            self.converted.add(path)
+        return surface
+
+    def scaled(self, path, size):
+        """
+        Return an image scaled to size; each size is scaled once.
+        """
+        key = (self.key(path), tuple(size))
+        surface = self.scaled_surfaces.get(key)
+        if surface is None:
+            surface = self.scaled_surfaces[key] = pygame.transform.scale(self.image(path), size)
+        return surface
+
+    def sound(self, path):
+        """
+        Return the decoded Sound of an effect.
+        """
+        return self.collect(path)
+
+    def ready(self, paths):
+        """
+        Return True when every path has been decoded.
+        """
+        for path in map(self.key, paths):
+            future = self.pending.get(path)
+            if future is None and path not in self.surfaces and path not in self.sounds:
+                return False
+            if future is not None and not future.done():
+                return False
+        return True
+
+    def progress(self):
+        """
+        Return (decoded, total) over everything queued or decoded so far.
+        """
+        with self.lock:
+            waiting = sum(not future.done() for future in self.pending.values())
+            total = len(self.pending) + len(self.surfaces) + len(self.sounds)
+        return total - waiting, total
+
+
+asset_manager = AssetManager()
@@ -0,0 +1,100 @@
+import pygame
+from profiler import profiler
+from asset_manager import asset_manager
+
+
+class SoundBank:
+    """
+    The SoundBank class plays sound effects on reserved mixer channels.
+    Effects are decoded by the asset manager and picked up the first time they are played.
+    """
+    music = 'assets/sound/background_music.mp3'
+    effects = {
+        'hit player': ('assets/sound/ball_player.wav', 1),
+        'hit wall': ('assets/sound/ball_wall.wav', 1),
+        'hit block': ('assets/sound/ball_block.wav', 1),
+        'drop': ('assets/sound/ball_drop.wav', 1),
+        'shot': ('assets/sound/shot.wav', 2),
+        'level over': ('assets/sound/level_over.wav', 1),
+        'break record': ('assets/sound/break_record.wav', 1),
+        'game over': ('assets/sound/game_over.wav', 1),
+    }
+
+    def __init__(self):
+        """
+        Create an empty bank; no channels are reserved until load is called.
+        """
+        self.sounds = {}
+        self.channels = {}
+        self.next_voice = {}
+
+    def load(self):
+        """
+        Reserve a fixed set of mixer channels (voices) for every effect.
+        """
+        if self.channels or not pygame.mixer.get_init():
+            return
+        voices = sum(limit for _, limit in self.effects.values())
+        pygame.mixer.set_num_channels(max(pygame.mixer.get_num_channels(), voices + 8))
+        pygame.mixer.set_reserved(voices)
+
+        channel_id = 0
+        for name, (path, limit) in self.effects.items():
+            self.channels[name] = [pygame.mixer.Channel(channel_id + n) for n in range(limit)]
+            self.next_voice[name] = 0
+            channel_id += limit
+
+    def play(self, name, volume):
+        """
+        Play an effect on one of its reserved voices, restarting the oldest one when all are busy.
+        """
+        if name not in self.channels:
+            return None
+        sound = self.sounds.get(name)
+        if sound is None:
+            sound = self.sounds[name] = asset_manager.sound(self.effects[name][0])
+        channels = self.channels[name]
+        for channel in channels:
+            if not channel.get_busy():
+                break
+        else:
+            channel = channels[self.next_voice[name]]
+            self.next_voice[name] = (self.next_voice[name] + 1) % len(channels)
+        channel.play(sound)
+        channel.set_volume(volume)
+        profiler.count('sounds')
+        return channel
+
+    def stop(self, name):
+        """
+        Stop every voice of an effect.
+        """
+        for channel in self.channels.get(name, []):
+            channel.stop()
+
+    def play_music(self, volume=None):
+        """
+        Start the looping background music.
+        """
+        if not pygame.mixer.get_init():
+            return
+        if volume is not None:
+            pygame.mixer.music.set_volume(volume)
+        pygame.mixer.music.load(self.music)
+        pygame.mixer.music.play(-1)
+
+    def stop_music(self):
+        """
+        Stop the background music.
+        """
+        if pygame.mixer.get_init():
+            pygame.mixer.music.stop()
+
+    def music_playing(self):
+        """
+        Return True while the background music is playing.
+        """
+        return bool(pygame.mixer.get_init()) and pygame.mixer.music.get_busy()
+
+
+sound_bank = SoundBank()
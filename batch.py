@@ -0,0 +1,133 @@
+import argparse
+import importlib
+import json
+import multiprocessing
+import statistics
+from collections import Counter
+
+
+def idle_policy(simulation):
+    """
+    Never move or shoot.
+    """
+    return None
+
+
+def track_policy(simulation):
+    """
+    Keep the paddle under the lowest falling ball, aiming a little off-centre so the ball does not
+    settle into a vertical bounce, and shoot whenever possible.
+    """
+    game = simulation.game
+    player = game.game_objects['player']
+    if not game.balls:
+        return False, False, True
+    ball = max(game.balls, key=lambda ball: (ball.dy > 0, ball.y))
+    offset = (simulation.ticks // 97 % 7 - 3) * player.box.w // 8
+    target = ball.box.centerx + offset
+    return target < player.box.centerx - 4, target > player.box.centerx + 4, True
+
+
+def sweep_policy(simulation):
+    """
+    Scripted paddle that sweeps the whole width back and forth.
+    """
+    return simulation.ticks // 90 % 2 == 0, simulation.ticks // 90 % 2 == 1, True
+
+
+POLICIES = {
+    'idle': idle_policy,
+    'track': track_policy,
+    'sweep': sweep_policy,
+}
+
+
+def load_policy(name):
+    """
+    Return a policy by its name in POLICIES or by a 'module:function' path.
+    """
+    if name in POLICIES:
+        return POLICIES[name]
+    module, _, function = name.partition(':')
+    return getattr(importlib.import_module(module), function)
+
+
+def run_game(job):
+    """
+    Simulate one seeded game until the level is cleared, the game is over or max_ticks have passed.
+    """
+    from simulation import Simulation
+
+    seed, level, policy_name, max_ticks, tick_rate = job
+    policy = load_policy(policy_name)
+    simulation = Simulation(level=level, seed=seed, tick_rate=tick_rate)
+    game = simulation.game
+    while simulation.ticks < max_ticks and game.levels_cleared == 0:
+        if not simulation.step(policy(simulation)):
+            break
+
+    return {
+        'seed': seed,
+        'level': level,
+        'points': game.points,
+        'lifes_lost': game.lifes_lost,
+        'cleared': game.levels_cleared > 0,
+        'time_to_clear': simulation.time if game.levels_cleared else None,
+        'time': simulation.time,
+        'state': game.game_state,
+        'rewards': dict(game.rewards_collected),
+    }
+
+
+def summarize(runs):
+    """
+    Aggregate per-game results into batch statistics.
+    """
+    clear_times = [run['time_to_clear'] for run in runs if run['cleared']]
+    rewards = Counter()
+    for run in runs:
+        rewards.update(run['rewards'])
+    return {
+        'games': len(runs),
+        'points_mean': statistics.fmean(run['points'] for run in runs),
+        'points_median': statistics.median(run['points'] for run in runs),
+        'lifes_lost_mean': statistics.fmean(run['lifes_lost'] for run in runs),
+        'clear_rate': len(clear_times) / len(runs),
+        'time_to_clear_mean': statistics.fmean(clear_times) if clear_times else None,
+        'time_to_clear_median': statistics.median(clear_times) if clear_times else None,
+        'rewards_per_game': {name: count / len(runs) for name, count in sorted(rewards.items())},
+    }
+
+
+def run_batch(games, level=None, policy='track', seed=0, processes=None, max_ticks=60 * 60 * 10, tick_rate=60):
+    """
+    Spread games seeded seed, seed + 1, ... over a multiprocessing pool and return the runs and their summary.
+    """
+    jobs = [(seed + n, level, policy, max_ticks, tick_rate) for n in range(games)]
+    # Workers are closed and joined rather than terminated: pygame's signal handlers swallow SIGTERM.
+    pool = multiprocessing.Pool(processes)
+    try:
+        runs = pool.map(run_game, jobs, chunksize=max(1, games // (4 * (processes or multiprocessing.cpu_count()))))
+    finally:
+        pool.close()
+        pool.join()
+    return {'runs': runs, 'summary': summarize(runs)}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Simulate many headless BreakOut games in parallel.')
+    parser.add_argument('--games', type=int, default=100)
+    parser.add_argument('--level', type=int, default=None, help='level number from assets/data.json (random if omitted)')
+    parser.add_argument('--policy', default='track', help=f'one of {", ".join(POLICIES)} or module:function')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the first game')
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--max-ticks', type=int, default=60 * 60 * 10)
+    parser.add_argument('--tick-rate', type=int, default=60)
+    parser.add_argument('--output', help='write every run and the summary to this JSON file')
+    args = parser.parse_args()
+
+    results = run_batch(args.games, args.level, args.policy, args.seed, args.processes, args.max_ticks, args.tick_rate)
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(results, output_file, indent=4)
+    print(json.dumps(results['summary'], indent=4))
@@ -0,0 +1,309 @@
+import argparse
+import json
+import math
+import platform
+import sys
+import time
+import numpy as np
+import pygame
+from simulation import Simulation
+from batch import track_policy
+from levels import level_pack
+from frames import MainMenu
+from ui_tools import Sprite, text_cache
+
+SEED = 1234
+
+
+def densest_level():
+    """
+    Return the number of the level with the most bricks.
+    """
+    name = max(level_pack.names(), key=lambda name: sum(cell != 0 for row in level_pack.load(name) for cell in row))
+    return int(name.split('_')[1])
+
+
+def percentile(values, fraction):
+    """
+    Return the value below which fraction of the sorted values fall.
+    """
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def frame_stats(costs, seconds):
+    """
+    Summarize per-frame costs in seconds as throughput and percentile frame cost in milliseconds.
+    """
+    return {
+        'frames': len(costs),
+        'seconds': seconds,
+        'fps': len(costs) / seconds if seconds else 0.0,
+        'mean_ms': sum(costs) / len(costs) * 1000,
+        'p50_ms': percentile(costs, 0.50) * 1000,
+        'p95_ms': percentile(costs, 0.95) * 1000,
+        'p99_ms': percentile(costs, 0.99) * 1000,
+        'max_ms': max(costs) * 1000,
+    }
+
+
+def add_balls(game, count):
+    """
+    Top the game up to count balls, fanned out over the upper half-plane.
+    """
+    while len(game.balls) < count:
+        ball = game.ball_pool.acquire()
+        if ball is None:
+            return
+        angle = math.radians(30 + 120 * (len(game.balls) % 7) / 6)
+        ball.dx, ball.dy = ball.speed * math.cos(angle), -ball.speed * math.sin(angle)
+        if any(other.fireball for other in game.balls):
+            ball.active_fireball()
+        game.balls.append(ball)
+        game.game_objects['game_surface'].add_object(ball, layer=1)
+
+
+def keep_shooter(game):
+    """
+    Re-arm the paddle gun whenever it runs out.
+    """
+    player = game.game_objects['player']
+    if not player.shooter:
+        player.set_shooter()
+
+
+def keep_fireball(game):
+    """
+    Give every ball the fireball again whenever it wears off.
+    """
+    for ball in game.balls:
+        if not ball.fireball:
+            ball.active_fireball()
+
+
+def play(frames, level=None, setup=None, each_frame=None):
+    """
+    Play a seeded headless game for frames ticks with the tracking policy, rendering every tick off-screen,
+    and return the frame statistics. A game that ends is restarted with the same seed.
+    """
+    simulation = Simulation(level=level, seed=SEED)
+    if setup:
+        setup(simulation.game)
+    costs = []
+    start = time.perf_counter()
+    for frame in range(frames):
+        if simulation.done:
+            simulation = Simulation(level=level, seed=SEED)
+            if setup:
+                setup(simulation.game)
+        tick = time.perf_counter()
+        if each_frame:
+            each_frame(simulation.game)
+        simulation.step(track_policy(simulation))
+        simulation.game.render(0.5)
+        costs.append(time.perf_counter() - tick)
+    return frame_stats(costs, time.perf_counter() - start)
+
+
+def dense_level(frames):
+    """
+    One ball on the level with the most bricks.
+    """
+    return play(frames, level=densest_level())
+
+
+def multiball(frames):
+    """
+    Twenty balls in play at all times.
+    """
+    return play(frames, level=densest_level(), each_frame=lambda game: add_balls(game, 20))
+
+
+def shooter(frames):
+    """
+    Constant fire from the paddle gun.
+    """
+    return play(frames, level=densest_level(), each_frame=keep_shooter)
+
+
+def fireball(frames):
+    """
+    Five fireballs sweeping through the bricks.
+    """
+    return play(frames, level=densest_level(), setup=lambda game: add_balls(game, 5), each_frame=keep_fireball)
+
+
+def menu_hover(frames):
+    """
+    Sweep the pointer across the main menu buttons, several motion events per frame, and render each frame.
+    """
+    simulation = Simulation(seed=SEED)
+    menu = MainMenu(simulation.window, simulation, 0)
+    points = [(450, y) for y in range(300, 700, 7)]
+    costs = []
+    start = time.perf_counter()
+    for frame in range(frames):
+        tick = time.perf_counter()
+        for n in range(8):
+            position = points[(frame * 8 + n) % len(points)]
+            menu.event_handler(pygame.event.Event(pygame.MOUSEMOTION, pos=position, rel=(0, 7), buttons=(0, 0, 0)))
+        menu.render()
+        costs.append(time.perf_counter() - tick)
+    return frame_stats(costs, time.perf_counter() - start)
+
+
+SCENARIOS = {
+    'dense_level': dense_level,
+    'multiball': multiball,
+    'shooter': shooter,
+    'fireball': fireball,
+    'menu_hover': menu_hover,
+}
+
+
+def measure(function, calls, reset=None):
+    """
+    Call function(n) for n in range(calls), after a short warm-up on negative n the timed calls never use,
+    and return the cost per call in microseconds. reset, when given, runs between the warm-up and the timing.
+    """
+    for n in range(1, max(1, calls // 10) + 1):
+        function(-n)
+    if reset:
+        reset()
+    start = time.perf_counter()
+    for n in range(calls):
+        function(n)
+    seconds = time.perf_counter() - start
+    return {'calls': calls, 'us_per_call': seconds / calls * 1e6}
+
+
+def micro_benchmarks(scale=1.0):
+    """
+    Time the hot subsystems in isolation on a seeded game of the densest level.
+    """
+    simulation = Simulation(level=densest_level(), seed=SEED)
+    game = simulation.game
+    player = game.game_objects['player']
+    ball = game.balls[0]
+    calls = lambda count: max(1, int(count * scale))
+
+    # A ball just under the brick field, moving up into it; its state is restored before every call.
+    state = (float(game.blocks.origin[0] + 300), float(game.blocks.origin[1] + game.blocks.rows * 25 + 4),
+             ball.speed, -ball.speed)
+    reach = pygame.rect.Rect(state[0], state[1], ball.box.w, ball.box.h).inflate(24, 24)
+    candidates = game.blocks.overlaps([reach])[0]
+
+    def ball_move(n):
+        ball.x, ball.y, ball.dx, ball.dy = state
+        ball.sync()
+        ball.move(candidates, player, simulation.dt)
+
+    def brick_overlaps(n):
+        game.blocks.overlaps([reach] * 20)
+
+    def sprite_construction(n):
+        Sprite(game.game_objects['game_surface'].surface, game.game_objects['game_surface'],
+               (1075, 732, 97, 96), (20, 20), (0, 0))
+
+    label = game.game_objects['points']
+
+    def render_text_cached(n):
+        label.render_text('Points', (255, 255, 255))
+
+    def render_text_uncached(n):
+        label.render_text(f'{SEED}-{n}', (255, 255, 255))
+
+    level = densest_level()
+
+    def load_level(n):
+        game.blocks.clear()
+        game.levels = [f'level_{level}']
+        game.load_level(level)
+
+    results = {
+        'ball_move': measure(ball_move, calls(20000)),
+        'brick_overlaps': measure(brick_overlaps, calls(5000)),
+        'sprite_construction': measure(sprite_construction, calls(5000)),
+        'render_text_cached': measure(render_text_cached, calls(20000)),
+        'render_text_uncached': measure(render_text_uncached, calls(2000), reset=text_cache.clear),
+        'load_level': measure(load_level, calls(200)),
+    }
+    text_cache.clear()
+    return results
+
+
+def run(frames=1800, only=None, scale=1.0):
+    """
+    Run the selected scenarios and the micro-benchmarks and return the results with the environment they ran in.
+    """
+    results = {
+        'meta': {
+            'seed': SEED,
+            'frames': frames,
+            'python': platform.python_version(),
+            'pygame': pygame.version.ver,
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+        },
+        'scenarios': {},
+        'micro': {},
+    }
+    for name, scenario in SCENARIOS.items():
+        if not only or name in only:
+            results['scenarios'][name] = scenario(frames)
+    if not only or 'micro' in only:
+        results['micro'] = micro_benchmarks(scale)
+    return results
+
+
+def compare(results, baseline, tolerance=0.15):
+    """
+    Compare results against a baseline and return (report lines, regressions).
+    A scenario regresses when its throughput drops or its p95 frame cost grows by more than tolerance;
+    a micro-benchmark regresses when its cost per call grows by more than tolerance.
+    """
+    checks = []
+    for name, stats in results['scenarios'].items():
+        if name in baseline.get('scenarios', {}):
+            base = baseline['scenarios'][name]
+            checks.append((f'{name} fps', base['fps'], stats['fps'], stats['fps'] < base['fps'] * (1 - tolerance)))
+            checks.append((f'{name} p95_ms', base['p95_ms'], stats['p95_ms'],
+                           stats['p95_ms'] > base['p95_ms'] * (1 + tolerance)))
+    for name, stats in results['micro'].items():
+        if name in baseline.get('micro', {}):
+            base = baseline['micro'][name]['us_per_call']
+            checks.append((f'{name} us/call', base, stats['us_per_call'],
+                           stats['us_per_call'] > base * (1 + tolerance)))
+
+    lines, regressions = [], []
+    for label, base, current, regressed in checks:
+        change = (current - base) / base * 100 if base else 0.0
+        lines.append(f'{label:<32}{base:12.3f}{current:12.3f}{change:+9.1f}%{"  REGRESSION" if regressed else ""}')
+        if regressed:
+            regressions.append(label)
+    return lines, regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the BreakOut game loop and subsystems headlessly.')
+    parser.add_argument('--frames', type=int, default=1800, help='frames per scenario')
+    parser.add_argument('--scale', type=float, default=1.0, help='multiplier for the micro-benchmark call counts')
+    parser.add_argument('--only', nargs='*', help=f'subset of {", ".join(SCENARIOS)}, micro')
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--baseline', help='compare against the results stored in this JSON file')
+    parser.add_argument('--tolerance', type=float, default=0.15, help='allowed slowdown before flagging a regression')
+    args = parser.parse_args()
+
+    results = run(args.frames, args.only, args.scale)
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(results, output_file, indent=4)
+    print(json.dumps({'scenarios': results['scenarios'], 'micro': results['micro']}, indent=4))
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            lines, regressions = compare(results, json.load(baseline_file), args.tolerance)
+        print('\n'.join(lines))
+        if regressions:
+            print(f'{len(regressions)} regression(s): {", ".join(regressions)}')
+            sys.exit(1)
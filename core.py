@@ -1,16 +1,22 @@
+import argparse
 import sys
 import time
 import pygame
 from ui_tools import Label
-from frames import MainMenu
+from frames import Loading
+from audio import sound_bank
+from profiler import profiler
+from asset_manager import asset_manager
 
 class Core:
     """
     The Core class initializes and runs the main game loop for the BreakOut game.
     """
-    def __init__(self, width, height, title, icon):
+    def __init__(self, width, height, title, icon, tick_rate=60, max_catch_up_steps=5):
         """
         Initialize the Core class with game window parameters.
+        tick_rate is the number of simulation steps per second and max_catch_up_steps the most steps
+        run in a single frame when rendering falls behind.
         """
         self.window = None
         self.width = width
@@ -18,51 +24,112 @@ class Core:
         self.title = title
         self.clock = pygame.time.Clock()
         self.fps = 60
+        self.tick_rate = tick_rate
+        self.max_catch_up_steps = max_catch_up_steps
         self.active_frame = None
-        self.icon = pygame.image.load(icon)
+        self.headless = False
+        self.record_dir = None
+        self.session_path = 'assets/session.bin'
+        self.icon = icon
 
     def initialize(self):
         """
-        Initialize Pygame, the mixer for sound, and the game window.
+        Initialize Pygame, the mixer and its sound bank, and the game window, and show the loading screen
+        while the assets decode in the background.
         """
         pygame.init()
         pygame.mixer.init()
-        pygame.mixer.music.set_volume(0.1)
-        background_music = 'assets/sound/background_music.mp3'
-        pygame.mixer.music.load(background_music)
-        pygame.mixer.music.play(-1)
+        sound_bank.load()
+        sound_bank.play_music(0.1)
 
         self.window = pygame.display.set_mode((self.width, self.height))
         pygame.display.set_caption(self.title)
-        pygame.display.set_icon(self.icon)
-        self.active_frame = MainMenu(self.window, self, 0.1)
+        pygame.display.set_icon(asset_manager.image(self.icon))
+        self.active_frame = Loading(self.window, self, 0.1)
 
     def event_handler(self):
         """
         Handle events such as quitting the game and passing events to the active frame.
+        F3 toggles the profiler overlay.
         """
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 sys.exit()
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+                if not profiler.toggle_overlay():
+                    self.active_frame.redraw()
+                continue
             self.active_frame.event_handler(event)
 
-    def draw(self):
+    def update(self, dt):
         """
-        Draw the active frame and update the display.
+        Advance the active frame by one simulation step of dt seconds.
         """
-        self.active_frame.draw()
-        pygame.display.flip()
+        self.active_frame.update(dt)
+
+    def draw(self, alpha=1.0):
+        """
+        Draw the active frame, interpolated alpha of the way to the next step, and update the display.
+        Frames that return a list of dirty rectangles only get those regions pushed to the screen.
+        """
+        with profiler.phase('draw'):
+            dirty = self.active_frame.render(alpha)
+            if profiler.overlay:
+                overlay = profiler.draw_overlay(self.window)
+                if dirty is not None:
+                    dirty.append(overlay)
+        with profiler.phase('display'):
+            if dirty is None:
+                pygame.display.flip()
+            elif dirty:
+                pygame.display.update(dirty)
 
     def run(self):
         """
-        Run the main game loop, handling events and drawing frames at a set FPS.
+        Run the main game loop: simulate in fixed steps of 1 / tick_rate seconds and render at a set FPS.
+        A profiler trace requested on the command line is written when the loop exits.
         """
-        while True:
-            self.event_handler()
-            self.draw()
-            self.clock.tick(self.fps)
+        dt = 1 / self.tick_rate
+        accumulator = 0.0
+        previous = time.perf_counter()
+        try:
+            while True:
+                profiler.begin_frame()
+                now = time.perf_counter()
+                accumulator += now - previous
+                previous = now
+
+                with profiler.phase('events'):
+                    self.event_handler()
+                steps = 0
+                with profiler.phase('update'):
+                    while accumulator >= dt and steps < self.max_catch_up_steps:
+                        self.update(dt)
+                        accumulator -= dt
+                        steps += 1
+                if accumulator >= dt:
+                    accumulator %= dt
+                profiler.count('steps', steps)
+
+                self.draw(accumulator / dt)
+                with profiler.phase('wait'):
+                    self.clock.tick(self.fps)
+                profiler.end_frame()
+        finally:
+            self.active_frame.close()
+            if profiler.trace:
+                profiler.export()
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='BreakOut')
+    parser.add_argument('--profile', action='store_true', help='show the profiler overlay (toggle with F3)')
+    parser.add_argument('--trace', help='record every frame and write them to this .csv or .json file on exit')
+    parser.add_argument('--record', metavar='DIR', help='save a replay of every game to this directory')
+    args = parser.parse_args()
+    if args.profile or args.trace:
+        profiler.enable(args.trace, overlay=args.profile)
+
     break_out = Core(900, 700, 'BreakOut', 'assets/img/icon.png')
+    break_out.record_dir = args.record
     break_out.initialize()
     break_out.run()
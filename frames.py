@@ -1,10 +1,24 @@
-import json
+import os
 import random
 import sys
 import time
+import collections
+import functools
+from concurrent.futures import ThreadPoolExecutor
 import pygame
 from ui_tools import *
 from game_objects import *
+from audio import sound_bank
+from asset_manager import asset_manager
+from physics import BrickGrid, EntityStore
+from levels import level_pack
+from pool import ObjectPool
+from profiler import profiler
+from records import record_store
+from replay import Recording
+from snapshot import SnapshotRing, capture, restore, save_snapshot, load_snapshot, delete_snapshot
+
+level_loader = ThreadPoolExecutor(max_workers=1, thread_name_prefix='level-loader')
 
 
 class Frame:
@@ -29,7 +43,16 @@ class Frame:
             if event.key == pygame.K_ESCAPE:
                 self.pause_window()
 
-    def draw(self):
+    def update(self, dt):
+        pass
+
+    def redraw(self):
+        self.window.fill((0, 0, 0))
+
+    def close(self):
+        pass
+
+    def render(self, alpha=1.0):
         for obj in [*self.static_objects, *self.active_objects]:
             obj.draw()
 
@@ -40,6 +63,7 @@ class Frame:
         self.window.fill((0, 0, 0))
 
     def load_frame(self, frame):
+        self.close()
         self.reset_frame()
         self.parent.active_frame = frame(self.window, self.parent, self.fx_volume)
 
@@ -68,21 +92,17 @@ class Frame:
             self.window.fill((0, 0, 0))
 
     def turn_music(self, mode):
-        if pygame.mixer.music.get_busy():
+        if sound_bank.music_playing():
             if mode == 'act':
-                pygame.mixer.music.stop()
+                sound_bank.stop_music()
                 self.popup_window.add_object(
                     Shape(self.popup_window.surface, self.popup_window, 'X', 'music_cross', (40, 40), (60, 80),
                           (255, 255, 255)))
         else:
             if mode == 'act':
-                background_music = 'assets/sound/background_music.mp3'
-                pygame.mixer.music.load(background_music)
-                pygame.mixer.music.play(-1)
-                for idx, obj in enumerate(self.popup_window.objects):
-                    if type(obj) == Shape:
-                        if obj.name == 'music_cross':
-                            del self.popup_window.objects[idx]
+                sound_bank.play_music()
+                for obj in self.popup_window.objects.find(Shape, name='music_cross'):
+                    self.popup_window.remove_object(obj)
             else:
                 self.popup_window.add_object(
                     Shape(self.popup_window.surface, self.popup_window, 'X', 'music_cross', (40, 40), (60, 80),
@@ -92,10 +112,8 @@ class Frame:
         if self.fx_volume == 0:
             if mode == 'act':
                 self.update_volume(0.3)
-                for idx, obj in enumerate(self.popup_window.objects):
-                    if type(obj) == Shape:
-                        if obj.name == 'fx_cross':
-                            del self.popup_window.objects[idx]
+                for obj in self.popup_window.objects.find(Shape, name='fx_cross'):
+                    self.popup_window.remove_object(obj)
             else:
                 self.popup_window.add_object(
                     Shape(self.popup_window.surface, self.popup_window, 'X', 'fx_cross', (40, 40), (200, 80),
@@ -113,7 +131,34 @@ class Frame:
             self.popup_window.fx_volume = volume
 
 
+class Loading(Frame):
+    # Shown at startup until the main menu's own assets are decoded; the rest then loads behind the menu.
+    def __init__(self, window, parent, fx_vol):
+        super().__init__(window, parent)
+        self.fx_volume = fx_vol
+        self.bar = pygame.rect.Rect(0, 0, 500, 30)
+        self.bar.center = self.window.get_rect().center
+        self.static_objects.append(Label(self.window, self.parent, 'Loading', 72, self.main_color, (0, 250), 'h'))
+        asset_manager.preload(MainMenu.assets)
+
+    def update(self, dt):
+        if asset_manager.ready(MainMenu.assets):
+            asset_manager.preload()
+            self.load_frame(MainMenu)
+
+    def render(self, alpha=1.0):
+        super().render(alpha)
+        done, total = asset_manager.progress()
+        progress = self.bar.inflate(-8, -8)
+        progress.w = progress.w * done // max(total, 1)
+        self.window.fill((0, 0, 0), self.bar)
+        pygame.draw.rect(self.window, self.main_color, self.bar, width=2)
+        self.window.fill(self.alt_color, progress)
+
+
 class MainMenu(Frame):
+    assets = ['assets/img/logo.png']
+
     def __init__(self, window, parent, fx_vol):
         super().__init__(window, parent)
         self.fx_volume = fx_vol
@@ -124,34 +169,58 @@ class MainMenu(Frame):
         # Title
         self.static_objects.append(Image(self.window, self.parent, 'assets/img/logo.png', (700, 300), (100, 0), 'h'))
 
-        # Buttons
-        self.active_objects.append(
-            Button(self.window, self.parent, 'Start Game', 72, self.main_color, self.alt_color, (0, 350), 'h',
-                   lambda: self.load_frame(Game)))
-        self.active_objects.append(
-            Button(self.window, self.parent, 'Records', 72, self.main_color, self.alt_color, (0, 450), 'h',
-                   lambda: self.load_frame(Records)))
-        self.active_objects.append(
-            Button(self.window, self.parent, 'Exit', 72, self.main_color, self.alt_color, (0, 550), 'h', sys.exit))
+        # Buttons, with Resume on top when a game was left unfinished
+        buttons = [('Start Game', lambda: self.load_frame(Game)), ('Records', lambda: self.load_frame(Records)),
+                   ('Exit', sys.exit)]
+        session = load_snapshot(self.parent.session_path) if self.parent.session_path else None
+        if session is not None:
+            buttons.insert(0, ('Resume', lambda: self.load_frame(functools.partial(Game, resume=session))))
+        gap = 300 // len(buttons)
+        for n, (text, action) in enumerate(buttons):
+            self.active_objects.append(
+                Button(self.window, self.parent, text, 72, self.main_color, self.alt_color, (0, 350 + gap * n), 'h',
+                       action))
 
 
 class Game(Frame):
-    def __init__(self, window, parent, fx_vol):
+    def __init__(self, window, parent, fx_vol, level=None, seed=None, replay=None, resume=None):
         super().__init__(window, parent)
         self.lifes = 3
         self.points = 0
         self.game_state = 'run'
-        self.levels = {}
-        self.records = {}
+        self.levels = []
+        self.next_level = None
+        self.next_level_name = None
+        self.record_saved = False
+        self.level_name = None
+        self.level_blocks = []
         self.game_objects = {}
         self.balls = []
-        self.blocks = []
+        self.blocks = BrickGrid()
+        self.brick_layer = None
+        self.entities = EntityStore(64)
         self.rewards = []
         self.popup_window = False
+        self.full_redraw = True
+        self.hud_state = None
+        self.start_level = level
+        # The seed and the per-tick controls are all that is needed to replay the game.
+        self.seed = seed if seed is not None else random.randrange(2 ** 32)
+        if not -2 ** 63 <= self.seed < 2 ** 63:
+            raise ValueError(f'{self.seed}: seeds must fit in a signed 64-bit integer')
+        self.random = random.Random(self.seed)
+        self.replay = replay
+        self.recording = Recording(self.seed, level, parent.tick_rate)
+        self.recording_saved = False
+        self.history = SnapshotRing()
+        self.levels_cleared = 0
+        self.lifes_lost = 0
+        self.rewards_collected = collections.Counter()
 
         self.fx_volume = fx_vol
-        self.level_over_sound = pygame.mixer.Sound('assets/sound/level_over.wav')
         self.load_ui()
+        if resume is not None:
+            self.resume(resume)
 
     def event_handler(self, event):
         if self.game_state != 'over':
@@ -159,6 +228,8 @@ class Game(Frame):
         key = pygame.key.get_pressed()
         if not self.popup_window:
             self.game_objects['player'].event_handler(event)
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_BACKSPACE and self.replay is None:
+                self.rewind(1)
             if key[pygame.K_ESCAPE]:
                 for ball in self.balls:
                     ball.freeze = False
@@ -170,15 +241,81 @@ class Game(Frame):
                     ball.freeze = True
             self.popup_window.event_handler(event)
 
-    def draw(self):
-        self.window.fill((0, 0, 0))
+    def update(self, dt):
+        if self.popup_window:
+            return
+        player = self.game_objects['player']
+        if self.replay is not None:
+            controls = next(self.replay, None)
+            if controls is None:
+                # The recording is over: hand the paddle back to the keyboard.
+                self.replay = None
+                controls = Controls()
+            player.controls = controls
+        self.recording.record(player.controls)
+        self.game_objects['game_surface'].update(dt)
+        with profiler.phase('logic'):
+            self.game_logic(dt)
+        if self.recording.ticks % self.history.interval == 0:
+            self.history.push(capture(self))
+
+    def redraw(self):
+        self.full_redraw = True
+
+    def close(self):
+        self.save_recording()
+        if self.game_state == 'over':
+            # A finished game is kept even when the window is closed from the game over popup.
+            self.store_result()
+        elif self.parent.session_path:
+            save_snapshot(self.parent.session_path, capture(self))
+
+    def rewind(self, seconds):
+        snapshot = self.history.rewind(round(seconds * self.parent.tick_rate / self.history.interval))
+        if snapshot is not None:
+            self.recording.truncate(restore(self, snapshot))
+
+    def resume(self, snapshot):
+        restore(self, snapshot)
+        self.history.push(snapshot)
+        # The input before the snapshot was never recorded here, so this game cannot be replayed from its seed.
+        self.recording_saved = True
+
+    def save_recording(self):
+        if self.recording_saved or not self.parent.record_dir:
+            return
+        os.makedirs(self.parent.record_dir, exist_ok=True)
+        self.recording.save(os.path.join(self.parent.record_dir, f'{int(time.time())}-{self.seed}.rpl'))
+        self.recording_saved = True
+
+    def render(self, alpha=1.0):
+        # Nothing moves while a popup halts the simulation, so draw the current positions instead of interpolating.
+        alpha = 1.0 if self.popup_window else alpha
+        hud = [self.game_objects['lifes'], self.game_objects['points']]
+        if self.popup_window or self.full_redraw:
+            # Popups are drawn straight over the window, so keep redrawing everything while one is open
+            # and once more after it closes.
+            self.full_redraw = bool(self.popup_window)
+            self.hud_state = (self.lifes, self.points)
+            self.window.fill((0, 0, 0))
+
+            for obj in hud:
+                obj.draw()
+            self.game_objects['game_surface'].render(alpha)
 
-        self.game_objects['lifes'].draw()
-        self.game_objects['points'].draw()
-        self.game_objects['game_surface'].draw()
+            super().render(alpha)
+            return None
 
-        self.game_logic()
-        super().draw()
+        dirty = self.game_objects['game_surface'].render_dirty(alpha)
+        if self.hud_state != (self.lifes, self.points):
+            self.hud_state = (self.lifes, self.points)
+            for obj in hud:
+                for rect in obj.drawn_rects():
+                    self.window.fill((0, 0, 0), rect)
+                    dirty.append(rect)
+                obj.draw()
+                dirty.extend(obj.drawn_rects())
+        return dirty
 
     def load_ui(self):
         # Data bar
@@ -188,78 +325,101 @@ class Game(Frame):
                                             duplicate=self.lifes)
 
         self.static_objects.append(Label(self.window, self.parent, 'Points', 50, self.main_color, (550, 10)))
-        self.game_objects['points'] = Label(self.window, self.parent, str(self.points), 50, self.main_color,
-                                            (850 - 20 * len(str(self.points)), 10))
+        self.game_objects['points'] = Counter(self.window, self.parent, self.points, 50, self.main_color, (850, 10))
 
         # Game
         self.game_objects['game_surface'] = Surface(self.window, self, (845, 615), (30, 70), 'h', 5)
         self.game_objects['player'] = Player(self.game_objects['game_surface'].surface,
-                                             self.game_objects['game_surface'], (0, 540), 'h')
-        self.balls.append(Ball(self.game_objects['game_surface'].surface, self.game_objects['game_surface']))
-        self.game_objects['game_surface'].add_object(self.game_objects['player'])
-        self.game_objects['game_surface'].add_object(self.balls[0])
-
-        with open('assets/data.json', mode='r') as data_file:
-            data = json.load(data_file)
-            self.levels = data['levels']
-            self.records = data['records']
+                                             self.game_objects['game_surface'], self.entities, (0, 540), 'h')
+        self.ball_pool = ObjectPool(lambda: Ball(self.game_objects['game_surface'].surface,
+                                                 self.game_objects['game_surface'], self.entities), 32)
+        # New rewards get a placeholder kind from the module generator so how many the pool has built never
+        # shifts the game's own random sequence; acquire draws the real kind from it.
+        self.reward_pool = ObjectPool(lambda: Reward(self.game_objects['game_surface'].surface,
+                                                     self.game_objects['game_surface'], self.entities, (0, 0)), 16)
+        fireball_animation.bake()
+        self.balls.append(self.ball_pool.acquire())
+        # Falling rewards are drawn beneath the paddle and the balls.
+        self.game_objects['game_surface'].add_object(self.game_objects['player'], layer=1)
+        self.game_objects['game_surface'].add_object(self.balls[0], layer=1)
+
+        self.levels = level_pack.names()
 
         self.window.fill((0, 0, 0))
-        self.load_level()
-
-    def game_logic(self):
-        for ball_idx, ball in enumerate(self.balls):
-            if ball is not None:
-                for idx, block in enumerate(self.blocks):
-                    if ball.check_brick_collision(block.box):
-                        ball.sounds['hit block'].stop()
-                        ball.sounds['hit block'].play().set_volume(self.fx_volume)
-                        self.update_points(10)
-                        if block.hit() or ball.fireball:
-                            self.add_reward(15, block.box.midbottom)
-                            self.game_objects['game_surface'].remove_object(self.blocks[idx])
-                            del self.blocks[idx]
-                            if len(self.blocks) == 0:
-                                self.reset_game()
-                                self.level_over_sound.stop()
-                                self.level_over_sound.play().set_volume(self.fx_volume)
-                                self.load_level()
-                        return
-                if ball.check_paddle_collision(self.game_objects['player']):
-                    ball.sounds['hit player'].stop()
-                    ball.sounds['hit player'].play().set_volume(self.fx_volume)
-
-                if ball.check_brick_collision(pygame.rect.Rect(0, 635, 845, 10)):
-                    ball.sounds['drop'].stop()
-                    ball.sounds['drop'].play().set_volume(self.fx_volume)
-                    if len(self.balls) == 1:
-                        self.lifes -= 1
-                        if self.lifes != 0:
-                            self.game_objects['lifes'].set_duplicate(self.lifes)
-                            self.reset_game()
-                        else:
-                            self.game_over()
-                    else:
-                        del self.balls[ball_idx]
-                        self.game_objects['game_surface'].remove_object(ball)
-
-        for bullet_idx, bullet in enumerate(self.game_objects['player'].bullets):
-            for block_idx, block in enumerate(self.blocks):
-                if bullet.check_collision(block.box) and len(self.blocks) != 0:
-                    del self.game_objects['player'].bullets[bullet_idx]
-                    self.update_points(10)
-                    if block.hit():
-                        self.add_reward(15, block.box.midbottom)
-                        self.game_objects['game_surface'].remove_object(self.blocks[block_idx])
-                        del self.blocks[block_idx]
-                        if len(self.blocks) == 0:
-                            self.reset_game()
-                            self.level_over_sound.stop()
-                            self.level_over_sound.play().set_volume(self.fx_volume)
-                            self.load_level()
-                    return
-
-        for idx, reward in enumerate(self.rewards):
+        self.load_level(self.start_level)
+
+    def move_entities(self, dt):
+        scale = dt * BASE_TICK_RATE
+        self.entities.sync(self.entities.step((EntityStore.BULLET, EntityStore.REWARD), scale))
+
+        # Balls that cannot reach a brick, the paddle or a wall this step move in bulk; the rest are swept.
+        surface = self.game_objects['game_surface'].surface.get_rect()
+        brick_bottom = self.blocks.origin[1] + self.blocks.rows * self.blocks.cell_size[1]
+        open_area = pygame.rect.Rect(0, brick_bottom, surface.w, self.game_objects['player'].box.top - brick_bottom)
+        advanced = self.entities.views_of(self.entities.advance_within(EntityStore.BALL, open_area, scale))
+        for ball in advanced:
+            ball.sync()
+            if ball.fireball:
+                ball.update_fireball_animation()
+        return advanced
+
+    def game_logic(self, dt):
+        player = self.game_objects['player']
+        bottom = self.game_objects['game_surface'].surface.get_height()
+        advanced = self.move_entities(dt)
+        for bullet in self.entities.views_of(self.entities.above(EntityStore.BULLET, 0)):
+            player.remove_bullet(bullet)
+        for reward in self.entities.views_of(self.entities.below(EntityStore.REWARD, bottom)):
+            self.rewards.remove(reward)
+            self.reward_pool.release(reward)
+            self.game_objects['game_surface'].remove_object(reward)
+
+        # Broad phase: every swept ball's reach and every bullet against every block in one pass,
+        # then resolved ball by ball and bullet by bullet.
+        swept = [ball for ball in self.balls if not ball.freeze and ball not in advanced]
+        bullets = list(player.bullets)
+        candidates = self.blocks.overlaps([ball.reach(dt) for ball in swept] + [bullet.box for bullet in bullets])
+        for ball, blocks in zip(swept, candidates):
+            hits = ball.move([block for block in blocks if block in self.blocks], player, dt)
+            for target in hits:
+                if target is player:
+                    sound_bank.play('hit player', self.fx_volume)
+                    continue
+                sound_bank.play('hit block', self.fx_volume)
+                self.hit_block(target, ball.fireball)
+            if player not in hits and ball.check_paddle_collision(player):
+                sound_bank.play('hit player', self.fx_volume)
+
+        for bullet, blocks in zip(bullets, candidates[len(swept):]):
+            block = next((block for block in blocks if block in self.blocks), None)
+            if block is not None:
+                player.remove_bullet(bullet)
+                self.hit_block(block)
+
+        if len(self.blocks) == 0:
+            self.levels_cleared += 1
+            self.reset_game()
+            sound_bank.play('level over', self.fx_volume)
+            self.load_level()
+            return
+
+        for ball in self.entities.views_of(self.entities.below(EntityStore.BALL, bottom)):
+            sound_bank.play('drop', self.fx_volume)
+            if len(self.balls) == 1:
+                self.lifes -= 1
+                self.lifes_lost += 1
+                if self.lifes != 0:
+                    self.game_objects['lifes'].set_duplicate(self.lifes)
+                    self.reset_game()
+                else:
+                    self.game_over()
+                return
+            else:
+                self.balls.remove(ball)
+                self.ball_pool.release(ball)
+                self.game_objects['game_surface'].remove_object(ball)
+
+        for reward in list(self.rewards):
             if reward.check_collision(self.game_objects['player'].box):
                 if reward.name == '+50':
                     self.update_points(50)
@@ -283,63 +443,128 @@ class Game(Frame):
                     self.lifes += 1
                     self.game_objects['lifes'].set_duplicate(self.lifes)
                 elif reward.name == '+ball':
-                    new_ball = Ball(self.game_objects['game_surface'].surface, self.game_objects['game_surface'])
-                    for ball in self.balls:
-                        if ball.fireball:
-                            new_ball.fireball = True
-                    self.balls.append(new_ball)
-                    self.game_objects['game_surface'].add_object(new_ball)
+                    new_ball = self.ball_pool.acquire()
+                    if new_ball is not None:
+                        if any(ball.fireball for ball in self.balls):
+                            new_ball.active_fireball()
+                        self.balls.append(new_ball)
+                        self.game_objects['game_surface'].add_object(new_ball, layer=1)
                 elif reward.name == 'fireball':
                     for ball in self.balls:
                         ball.active_fireball()
                 elif reward.name == 'shooter':
                     self.game_objects['player'].set_shooter()
 
-                del self.rewards[idx]
+                self.rewards_collected[reward.name] += 1
+                self.rewards.remove(reward)
+                self.reward_pool.release(reward)
                 self.game_objects['game_surface'].remove_object(reward)
 
-    def load_level(self, level=None):
-        self.popup_window = Surface(self.window, self.parent, (300, 150), (0, 0), 'vh', 2)
-        self.popup_window.add_object(Label(self.popup_window.surface, self.parent, 'LOADING', 36,
-                                           self.main_color,
-                                           (0, 55), 'h'))
-        self.popup_window.draw()
-        pygame.display.flip()
+    def hit_block(self, block, destroy=False):
+        self.update_points(10)
+        if block.hit() or destroy:
+            self.add_reward(15, block.box.midbottom)
+            self.blocks.remove(block)
+        self.game_objects['game_surface'].refresh(self.brick_layer.repaint(block, block in self.blocks))
+
+    def restore_level(self, name, staminas):
+        # Bring the bricks to the given staminas (0 for destroyed), repainting only those that changed.
+        if name != self.level_name:
+            self.blocks.clear()
+            if name == self.next_level_name and self.next_level is not None:
+                # The level is already prefetched: take it whole and repaint the restored bricks below.
+                self.level_name, self.level_blocks, self.brick_layer = self.next_level.result()
+                self.next_level = None
+                self.next_level_name = None
+                for block in self.level_blocks:
+                    self.blocks.add(block)
+                self.game_objects['game_surface'].set_background(self.brick_layer.surface)
+            else:
+                self.level_name, self.level_blocks, self.brick_layer = self.build_level(name, staminas)
+                for block, stamina in zip(self.level_blocks, staminas):
+                    if stamina:
+                        self.blocks.add(block)
+                self.game_objects['game_surface'].set_background(self.brick_layer.surface)
+                return
+        for block, stamina in zip(self.level_blocks, staminas):
+            if stamina and (block not in self.blocks or stamina != block.stamina):
+                block.set_stamina(stamina)
+                if block not in self.blocks:
+                    self.blocks.add(block)
+            elif not stamina and block in self.blocks:
+                self.blocks.remove(block)
+            else:
+                continue
+            self.game_objects['game_surface'].refresh(self.brick_layer.repaint(block, block in self.blocks))
+
+    def build_level(self, name, staminas=None):
+        # Runs on the loader thread: builds the blocks and pre-renders the brick layer off the game loop.
+        # A restore passes the staminas of its snapshot (0 for destroyed) so the layer holds only what is left.
         x, y = (75, 35)
         x_gap = 70
         y_gap = 25
-        if level is None:
-            level_tup = random.choice(list(self.levels.items()))
-            level_data = level_tup[1]
-            del self.levels[level_tup[0]]
-        else:
-            level_data = self.levels[f'level_{level}']
-            del self.levels[f'level_{level}']
-        for r, row in enumerate(level_data):
-            if len(row) == 1:
-                row = [row[0] for i in range(10)]
+        game_surface = self.game_objects['game_surface']
+        blocks = []
+        for r, row in enumerate(level_pack.load(name)):
             for c, col in enumerate(row):
                 if col != 0:
                     position = ((x + (x_gap * c), y + (y_gap * r)))
-                    block = Block(self.game_objects['game_surface'].surface, self.game_objects['game_surface'],
-                                  position, col)
-                    self.blocks.append(block)
-                    self.game_objects['game_surface'].add_object(block)
-        self.popup_window = None
+                    blocks.append(Block(game_surface.surface, game_surface, position, col))
+        if staminas is None:
+            return name, blocks, BrickLayer(game_surface.surface.get_size(), blocks)
+        for block, stamina in zip(blocks, staminas):
+            if stamina and stamina != block.stamina:
+                block.set_stamina(stamina)
+        visible = [block for block, stamina in zip(blocks, staminas) if stamina]
+        return name, blocks, BrickLayer(game_surface.surface.get_size(), visible)
+
+    def prefetch_level(self):
+        self.next_level = None
+        self.next_level_name = None
+        if self.levels:
+            name = self.random.choice(self.levels)
+            self.levels.remove(name)
+            self.next_level = level_loader.submit(self.build_level, name)
+            self.next_level_name = name
+
+    def restore_prefetch(self, name):
+        # A level already being built is kept; it is only swapped when the restored game expects another one.
+        if name != self.next_level_name:
+            self.next_level_name = name
+            self.next_level = level_loader.submit(self.build_level, name) if name else None
+
+    def load_level(self, level=None):
+        if level is None and self.next_level is not None:
+            self.level_name, blocks, self.brick_layer = self.next_level.result()
+        else:
+            name = self.random.choice(self.levels) if level is None else f'level_{level}'
+            self.levels.remove(name)
+            self.level_name, blocks, self.brick_layer = self.build_level(name)
+        self.level_blocks = blocks
+        for block in blocks:
+            self.blocks.add(block)
+        # The brick layer is the game surface's background: bricks cost nothing per frame until one is hit.
+        self.game_objects['game_surface'].set_background(self.brick_layer.surface)
+        self.full_redraw = True
+        self.prefetch_level()
 
     def add_reward(self, chance, position):
-        reward_chance = random.randint(1, 100)
+        reward_chance = self.random.randint(1, 100)
         if reward_chance <= chance:
-            reward = Reward(self.game_objects['game_surface'].surface,
-                            self.game_objects['game_surface'], position=position)
+            reward = self.reward_pool.acquire(position, self.random)
+            if reward is None:
+                return
             self.rewards.append(reward)
             self.game_objects['game_surface'].add_object(reward)
 
     def game_over(self):
         self.game_state = 'over'
         self.pause_game()
-        if self.check_record():
-            pygame.mixer.Sound('assets/sound/break_record.wav').play().set_volume(self.fx_volume)
+        self.save_recording()
+        if self.parent.session_path:
+            delete_snapshot(self.parent.session_path)
+        if record_store.qualifies(self.points, 5):
+            sound_bank.play('break record', self.fx_volume)
             self.popup_window = Surface(self.window, self.parent, (400, 250), (0, 0), 'vh', 2)
             self.popup_window.add_object(Label(self.popup_window.surface, self.popup_window, 'New  record  achieved',
                                                36, self.main_color,
@@ -353,8 +578,7 @@ class Game(Frame):
                                                 self.main_color,
                                                 self.alt_color, (190, 200),
                                                 action=lambda: self.save_record(
-                                                    str(*[textbox.text for textbox in self.popup_window.objects if
-                                                          type(textbox) == TextBox])),
+                                                    self.popup_window.objects.find(TextBox)[0].text),
                                                 center='h'))
 
             self.popup_window.add_object(Button(self.popup_window.surface, self.popup_window, 'again', 26, self.main_color,
@@ -363,7 +587,8 @@ class Game(Frame):
                                                 self.main_color,
                                                 self.alt_color, (320, 200), action=lambda: self.load_frame(MainMenu)))
         else:
-            pygame.mixer.Sound('assets/sound/game_over.wav').play().set_volume(self.fx_volume)
+            self.store_result()
+            sound_bank.play('game over', self.fx_volume)
             self.popup_window = Surface(self.window, self.parent, (400, 160), (0, 0), 'vh', 1)
             self.popup_window.add_object(Label(self.popup_window.surface, self.parent, 'Game Over', 36,
                                                self.main_color,
@@ -374,29 +599,18 @@ class Game(Frame):
                                                 self.main_color,
                                                 self.alt_color, (320, 115), action=lambda: self.load_frame(MainMenu)))
 
-    def check_record(self):
-        for idx, record in enumerate(self.records):
-            if self.points > record[0]:
-                record_list = list(self.records[:-1])
-                record_list.insert(idx, (self.points, "%ptr%"))
-                self.records = record_list
-                return True
-        return False
+    def store_result(self, name='None'):
+        # Every finished game is kept; headless simulations stay off the leaderboard.
+        if self.record_saved or self.parent.headless:
+            return False
+        record_store.add(self.points, name, level=self.level_name, levels_cleared=self.levels_cleared)
+        self.record_saved = True
+        return True
 
     def save_record(self, name):
-        saved = False
-        for idx, record in enumerate(self.records):
-            if '%ptr%' == record[1]:
-                self.records[idx] = (record[0], name)
-                saved = True
-        if saved:
+        if self.store_result(name):
             self.popup_window.add_object(Label(self.popup_window.surface, self.popup_window, 'Saved', 26,
                                                self.alt_color, (190, 200), center='h'))
-            with open('assets/data.json', 'r+') as data_file:
-                data = json.load(data_file)
-                data['records'] = self.records
-                data_file.seek(0)
-                data_file.write(json.dumps(data, indent=4))
 
     def pause_game(self):
         if self.popup_window:
@@ -413,46 +627,100 @@ class Game(Frame):
 
     def reset_game(self):
         self.game_objects['player'].reset()
-        for idx, ball in enumerate(self.balls):
+        for ball in self.balls:
             self.game_objects['game_surface'].remove_object(ball)
-            del self.balls[idx]
-        self.balls.append(Ball(self.game_objects['game_surface'].surface, self.game_objects['game_surface']))
-        self.balls[0].reset()
-        self.game_objects['game_surface'].add_object(self.balls[0])
+        self.ball_pool.release_all(self.balls)
+        self.balls.append(self.ball_pool.acquire())
+        self.game_objects['game_surface'].add_object(self.balls[0], layer=1)
 
-        while len(self.rewards):
-            self.game_objects['game_surface'].remove_object(self.rewards[0])
-            del self.rewards[0]
+        for reward in self.rewards:
+            self.game_objects['game_surface'].remove_object(reward)
+        self.reward_pool.release_all(self.rewards)
 
     def update_points(self, points):
         self.points += points
-        self.game_objects['points'] = Label(self.window, self.parent, str(self.points), 50, self.main_color,
-                                            (850 - 20 * len(str(self.points)), 10))
+        self.game_objects['points'].set_value(self.points)
 
 
 class Records(Frame):
+    # (title, seconds back from now or None for all games, per-level bests)
+    views = [('all  time', None, False), ('last  24h', 24 * 3600, False), ('last  7  days', 7 * 24 * 3600, False),
+             ('level  bests', None, True)]
+    page_size = 5
+
     def __init__(self, window, parent, fx_vol):
         super().__init__(window, parent)
         self.records = []
+        self.view = 0
+        self.page = 0
+        self.title = None
+        self.view_button = None
         self.load_ui()
 
     def load_ui(self):
         # Title
-        self.static_objects.append(Label(self.window, self.parent, 'Records', 90, self.main_color, (0, 50), 'h'))
+        self.title = Label(self.window, self.parent, 'Records', 90, self.main_color, (0, 50), 'h')
 
-        # Load records from JSON
-        with open('assets/data.json', mode='r') as data_file:
-            data = json.load(data_file)
-            self.records = data['records']
-
-        # Display records
-        record_spacing = 80
-        for idx, record in enumerate(self.records):
-            y_offset = 160 + idx * record_spacing
-            self.static_objects.append(Label(self.window, self.parent, f'{idx + 1}', 60, self.main_color, (100, y_offset)))
-            self.static_objects.append(Label(self.window, self.parent, f' {record[1]}', 60, self.main_color, (150, y_offset)))
-            self.static_objects.append(Label(self.window, self.parent, f'{record[0]}', 60, self.main_color, (670, y_offset)))
+        # Paging and view controls
+        self.active_objects.append(Button(self.window, self.parent, '<', 50, self.main_color, self.alt_color, (60, 510),
+                                          action=lambda: self.show_page(self.page - 1)))
+        self.view_button = Button(self.window, self.parent, self.views[0][0], 50, self.main_color, self.alt_color,
+                                  (0, 510), 'h', action=self.next_view)
+        self.active_objects.append(self.view_button)
+        self.active_objects.append(Button(self.window, self.parent, '>', 50, self.main_color, self.alt_color, (810, 510),
+                                          action=lambda: self.show_page(self.page + 1)))
 
         # Back button
-        self.active_objects.append(Button(self.window, self.parent, 'back', 70, self.main_color, self.alt_color, (0, 600), 'h',
+        self.active_objects.append(Button(self.window, self.parent, 'back', 60, self.main_color, self.alt_color, (0, 620), 'h',
                                          action=lambda: self.load_frame(MainMenu)))
+        self.show_page(0)
+
+    def next_view(self):
+        self.view = (self.view + 1) % len(self.views)
+        self.view_button.set_text(self.views[self.view][0])
+        self.show_page(0)
+
+    def query(self, offset, count):
+        title, window, per_level = self.views[self.view]
+        if per_level:
+            bests = record_store.level_bests()
+            return len(bests), bests[offset:offset + count]
+        return record_store.count(window=window), record_store.top(count, offset, window=window)
+
+    def my_rank(self):
+        latest = record_store.latest()
+        title, window, per_level = self.views[self.view]
+        if latest is None:
+            return 'no  games  yet'
+        if per_level:
+            if not latest.get('level'):
+                return ''
+            return (f'last  game  {record_store.position(latest, level=latest["level"])}'
+                    f'  of  {record_store.count(level=latest["level"])}  on  level  {latest["level"].split("_")[1]}')
+        if window and latest['time'] < time.time() - window:
+            return 'no  games  in  this  period'
+        return f'last  game  {record_store.position(latest, window=window)}  of  {record_store.count(window=window)}'
+
+    def show_page(self, page):
+        # Only the rows on screen are turned into Labels.
+        total, records = self.query(max(page, 0) * self.page_size, self.page_size)
+        if page < 0 or (page > 0 and not records):
+            return
+        self.page = page
+        self.records = records
+        per_level = self.views[self.view][2]
+
+        self.static_objects = [self.title]
+        record_spacing = 70
+        for idx, record in enumerate(self.records):
+            y_offset = 160 + idx * record_spacing
+            first = record['level'].split('_')[1] if per_level else page * self.page_size + idx + 1
+            self.static_objects.append(Label(self.window, self.parent, f'{first}', 60, self.main_color, (60, y_offset)))
+            # Games left unnamed are kept for ranking but shown as such.
+            name = record['name'] if record['name'] != 'None' else 'unnamed'
+            self.static_objects.append(Label(self.window, self.parent, f' {name}', 60, self.main_color, (190, y_offset)))
+            self.static_objects.append(Label(self.window, self.parent, f'{record["points"]}', 60, self.main_color, (670, y_offset)))
+        if not total:
+            self.static_objects.append(Label(self.window, self.parent, 'no  records', 60, self.main_color, (0, 300), 'h'))
+        self.static_objects.append(Label(self.window, self.parent, self.my_rank(), 30, self.main_color, (0, 575), 'h'))
+        self.redraw()
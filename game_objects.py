@@ -1,69 +1,159 @@
 import random
 import math
 import pygame
-import time
-from ui_tools import Sprite
+from collections import namedtuple
+from ui_tools import Sprite, Animation
+from audio import sound_bank
+from physics import sweep, EntityStore
+from pool import ObjectPool
+
+# Speeds are expressed in pixels per tick at this rate and scaled by the actual timestep.
+BASE_TICK_RATE = 60
+
+
+class Controls(namedtuple('Controls', ['left', 'right', 'shoot'], defaults=(False, False, False))):
+    @classmethod
+    def from_keys(cls, key):
+        return cls(bool(key[pygame.K_LEFT]), bool(key[pygame.K_RIGHT]), bool(key[pygame.K_SPACE]))
+
+
+class EntityView:
+    def attach(self, entities, kind):
+        self.entities = entities
+        self.slot = entities.allocate(self, kind)
+
+    @property
+    def x(self):
+        return float(self.entities.x[self.slot])
+
+    @x.setter
+    def x(self, value):
+        self.entities.x[self.slot] = value
+
+    @property
+    def y(self):
+        return float(self.entities.y[self.slot])
+
+    @y.setter
+    def y(self, value):
+        self.entities.y[self.slot] = value
+
+    @property
+    def dx(self):
+        return float(self.entities.dx[self.slot])
+
+    @dx.setter
+    def dx(self, value):
+        self.entities.dx[self.slot] = value
+
+    @property
+    def dy(self):
+        return float(self.entities.dy[self.slot])
+
+    @dy.setter
+    def dy(self, value):
+        self.entities.dy[self.slot] = value
+
+    @property
+    def freeze(self):
+        return bool(self.entities.flags[self.slot] & EntityStore.FROZEN)
+
+    @freeze.setter
+    def freeze(self, value):
+        if value:
+            self.entities.flags[self.slot] |= EntityStore.FROZEN
+        else:
+            self.entities.flags[self.slot] &= EntityStore.ACTIVE
+
+    def activate(self):
+        self.entities.flags[self.slot] = EntityStore.ACTIVE
+        self.entities.w[self.slot], self.entities.h[self.slot] = self.box.size
+
+    def retire(self):
+        self.entities.flags[self.slot] = 0
+
+    def sync(self):
+        self.box.topleft = (self.x, self.y)
 
 
 class Player(Sprite):
-    def __init__(self, window, parent, position,center=''):
+    def __init__(self, window, parent, entities, position,center=''):
         super().__init__(window, parent, (530, 23, 202, 53), (100, 30), position)
         self.bounds = self.window.get_rect()
         self.paddle_size = 1
         self.speed = 9
         self.speed_limits = [self.speed/2.5,self.speed*2.5]
-        self.move_state = False
+        self.controls = Controls()
         self.shooter = False
         self.shooter_cd = 1
         self.shooter_timer = None
         self.bullets_amount = 0
         self.bullets_sprite = None
         self.bullets = []
+        self.bullet_pool = ObjectPool(lambda: Bullet(self.window, self.parent, entities, (0, 0)), 8)
         if center:
             self.set_center(center)
+        # The paddle position is kept as a float so fractional steps add up at any tick rate.
+        self.x = float(self.box.x)
 
 
     def event_handler(self, event):
         super().event_handler(event)
-        key = pygame.key.get_pressed()
-        if key[pygame.K_RIGHT] or key[pygame.K_LEFT]:
-            self.move_state = True
-        else:
-            self.move_state = False
-        if key[pygame.K_SPACE] and self.shooter and not self.shooter_timer:
-            self.shoot()
+        self.controls = Controls.from_keys(pygame.key.get_pressed())
+
 
 
+    def update(self, dt):
+        self.store_position()
+        if self.controls.left or self.controls.right:
+            self.move(dt)
+        if self.controls.shoot and self.shooter and not self.shooter_timer:
+            self.shoot()
+        if self.shooter:
+            for bullet in self.bullets:
+                bullet.update(dt)
 
-    def draw(self):
-        super().draw()
-        if self.move_state:
-            self.move(pygame.key.get_pressed())
+            if self.shooter_timer:
+                self.shooter_timer -= dt
+                if self.shooter_timer <= 0:
+                    self.shooter_timer = None
+
+    def render(self, alpha=1.0):
+        super().render(alpha)
         if self.shooter:
             self.bullets_sprite.draw()
-            for idx,bullet in enumerate(self.bullets):
-                bullet.draw()
+            for bullet in self.bullets:
+                bullet.render(alpha)
 
-            if self.shooter_timer and time.time() - self.shooter_timer >= self.shooter_cd:
-                self.shooter_timer = None
+    def drawn_rects(self):
+        if not self.shooter:
+            return self.drawn
+        return [*self.drawn, *self.bullets_sprite.drawn, *(rect for bullet in self.bullets for rect in bullet.drawn)]
 
-    def move(self, key):
+    def move(self, dt):
         if not self.parent.parent.popup_window:
-            if key[pygame.K_RIGHT] and self.box.right + 10 < self.bounds.w:
-                self.box.x += self.speed
-            if key[pygame.K_LEFT] and self.box.left - 3 > self.bounds.x:
-                self.box.x -= self.speed
+            if self.controls.right and self.box.right + 10 < self.bounds.w:
+                self.x += self.speed * dt * BASE_TICK_RATE
+            if self.controls.left and self.box.left - 3 > self.bounds.x:
+                self.x -= self.speed * dt * BASE_TICK_RATE
+            self.box.x = round(self.x)
 
     def shoot(self):
         if self.bullets_amount != 0:
-            bullet = Bullet(self.window, self.parent, (0, 0))
-            bullet.update_position((self.box.centerx - bullet.box.w, self.box.y - 2))
-            self.bullets.append(Bullet(self.window, self.parent, (self.box.centerx, self.box.top - 20)))
+            bullet = self.bullet_pool.acquire((self.box.centerx, self.box.top - 20))
+            if bullet is None:
+                return False
+            self.bullets.append(bullet)
+            sound_bank.play('shot', self.parent.parent.fx_volume)
             self.update_magazine()
-            self.shooter_timer = time.time()
+            self.shooter_timer = self.shooter_cd
             return True
         return False
 
+    def remove_bullet(self, bullet):
+        self.bullets.remove(bullet)
+        self.bullet_pool.release(bullet)
+
     def set_shooter(self):
         self.shooter = True
         self.bullets_amount = 5
@@ -87,236 +177,282 @@ class Player(Sprite):
 
     def reset(self):
         self.update_position((0, 540),'h')
+        self.x = float(self.box.x)
+        self.previous = None
         self.paddle_size = 1
         self.update_paddle()
         self.speed = 9
         self.shooter = False
-        self.bullets = []
+        self.bullet_pool.release_all(self.bullets)
+
+
+fireball_animation = Animation([(1216, 24, 452, 109), (1216, 157, 501, 114), (1217, 304, 522, 102),
+                                (1216, 423, 516, 103)], (50, 20), 0.1, angles=(45, 90, 135, 225, 270, 315))
 
 
-class Ball(Sprite):
-    def __init__(self, window, parent,):
+class Ball(EntityView, Sprite):
+    # Flame angle and offset from the ball for each (horizontal, vertical) direction of travel.
+    fireball_poses = {
+        (1, -1): (225, (-33, 8)),
+        (-1, -1): (315, (6, 4)),
+        (1, 1): (135, (-36, -34)),
+        (-1, 1): (45, (5, -35)),
+        (0, 1): (90, (0, -40)),
+        (0, -1): (270, (2, 15)),
+    }
+
+    def __init__(self, window, parent, entities):
         super().__init__(window, parent, (1075, 732, 97, 96), (20, 20), (0, 0))
+        self.attach(entities, EntityStore.BALL)
         self.speed = 4.5
         self.freeze = False
         self.fireball = False
         self.fireball_mask = None
         self.fireball_timer = None
-        self.fireball_stages = [(1216,24,452,109),(1216,157,501,114),(1217,304,522,102),(1216,423,516,103)]
-        self.fireball_stage = 0
-        self.fireball_animation_angle = 0
-        self.fireball_animation_timer = False
-        self.fireball_animation_rate = 0.1
+        self.fireball_clock = 0
+        self.fireball_duration = 15
+        self.max_impacts = 4
         self.dx = self.speed
         self.dy = -self.speed
         self.update_position((0, 500),'h')
         self.x, self.y = self.box.topleft
         self.bounds = self.window.get_rect()
-        self.sounds = {
-            'hit player': pygame.mixer.Sound('assets/sound/ball_player.wav'),
-            'hit wall': pygame.mixer.Sound('assets/sound/ball_wall.wav'),
-            'hit block': pygame.mixer.Sound('assets/sound/ball_block.wav'),
-            'drop': pygame.mixer.Sound('assets/sound/ball_drop.wav')
-        }
 
 
-    def draw(self):
+    def update(self, dt):
+        self.store_position()
         if self.fireball:
-            self.fireball_mask.draw()
-            if time.time() - self.fireball_timer >= 15:
+            self.fireball_mask.store_position()
+            self.fireball_clock += dt
+            self.fireball_timer -= dt
+            if self.fireball_timer <= 0:
                 self.deactive_fireball()
 
-        super().draw()
-        if not self.freeze:
-            self.move()
-
-    def move(self):
-        if self.box.x + self.box.w > self.bounds.width or self.box.x < self.bounds.x:
-            self.sounds['hit wall'].stop()
-            self.sounds['hit wall'].play().set_volume(self.parent.parent.fx_volume)
-            self.dx *= -1
-        if self.box.y < self.bounds.y:
-            self.sounds['hit wall'].stop()
-            self.sounds['hit wall'].play().set_volume(self.parent.parent.fx_volume)
-            self.dy *= -1
-        self.x += self.dx
-        self.y += self.dy
+    def render(self, alpha=1.0):
+        if self.fireball:
+            self.fireball_mask.render(alpha)
+
+        super().render(alpha)
+
+    def drawn_rects(self):
+        if not self.fireball:
+            return self.drawn
+        return [*self.fireball_mask.drawn, *self.drawn]
+
+    def move(self, bricks=(), paddle=None, dt=1 / BASE_TICK_RATE):
+        hits = []
+        remaining = dt * BASE_TICK_RATE
+        for _ in range(self.max_impacts):
+            dx, dy = self.dx * remaining, self.dy * remaining
+            box = (self.x, self.y, self.box.w, self.box.h)
+            impact = self.wall_impact(box, dx, dy)
+            for target in [*bricks, paddle]:
+                if target is None or target in hits:
+                    continue
+                contact = sweep(box, dx, dy, target.box)
+                if contact and (impact is None or contact[0] < impact[0]):
+                    impact = (*contact, target)
+
+            if impact is None:
+                self.x += dx
+                self.y += dy
+                break
+
+            time_of_impact, normal, target = impact
+            self.x += dx * time_of_impact
+            self.y += dy * time_of_impact
+            self.update_position((self.x, self.y))
+            remaining *= 1 - time_of_impact
+            if target is None:
+                sound_bank.play('hit wall', self.parent.parent.fx_volume)
+                self.reflect(normal)
+            elif target is paddle:
+                hits.append(target)
+                self.bounce(target.box)
+            else:
+                hits.append(target)
+                if not self.fireball:
+                    self.reflect(normal)
+
         self.update_position((self.x, self.y))
         if self.fireball:
             self.update_fireball_animation()
+        return hits
+
+    def wall_impact(self, box, dx, dy):
+        x, y, w, h = box
+        impacts = []
+        if dx < 0 and x + dx < self.bounds.left:
+            impacts.append((max((self.bounds.left - x) / dx, 0), (1, 0), None))
+        if dx > 0 and x + w + dx > self.bounds.right:
+            impacts.append((max((self.bounds.right - x - w) / dx, 0), (-1, 0), None))
+        if dy < 0 and y + dy < self.bounds.top:
+            impacts.append((max((self.bounds.top - y) / dy, 0), (0, 1), None))
+        return min(impacts, key=lambda impact: impact[0], default=None)
+
+    def reflect(self, normal):
+        if normal[0]:
+            self.dx = abs(self.dx) * normal[0]
+        if normal[1]:
+            self.dy = abs(self.dy) * normal[1]
+
+    def reach(self, dt=1 / BASE_TICK_RATE):
+        distance = math.ceil(math.hypot(self.dx, self.dy) * dt * BASE_TICK_RATE) + 1
+        return self.box.inflate(distance * 2, distance * 2)
 
     def update_speed(self, speed):
         self.speed = speed
         self.dx = self.speed if self.dx > 0 else -self.speed
         self.dy = self.speed if self.dy > 0 else -self.speed
 
-    def check_brick_collision(self, object_rect):
-        collision_detected = False
-
-        # Determine overlap amounts
-        overlap_left = self.box.right - object_rect.left
-        overlap_right = object_rect.right - self.box.left
-        overlap_top = self.box.bottom - object_rect.top
-        overlap_bottom = object_rect.bottom - self.box.top
-
-        # Find the smallest overlap
-        smallest_overlap = min(overlap_left, overlap_right, overlap_top, overlap_bottom)
-
-        # Adjust ball direction based on the smallest overlap
-        if self.box.colliderect(object_rect):
-            collision_detected = True
-            if self.fireball:
-                return True
-            if smallest_overlap == overlap_left:
-                self.dx = -abs(self.dx)
-                self.box.right = object_rect.left  # Adjust position to avoid sticking
-            elif smallest_overlap == overlap_right:
-                self.dx = abs(self.dx)
-                self.box.left = object_rect.right  # Adjust position to avoid sticking
-            elif smallest_overlap == overlap_top:
-                self.dy = -abs(self.dy)
-                self.box.bottom = object_rect.top  # Adjust position to avoid sticking
-            elif smallest_overlap == overlap_bottom:
-                self.dy = abs(self.dy)
-                self.box.top = object_rect.bottom  # Adjust position to avoid sticking
-
-        return collision_detected
-
     def check_paddle_collision(self, object_rect):
         object_box = object_rect.box
         collision_detected = False
         if self.box.colliderect(object_box):
             collision_detected = True
-            offset = (self.box.centerx - object_box.left) / object_box.width
-            flag = False
-
-            if offset <= 0:
-                offset = 0
-            elif offset >= 1:
-                offset = 1
+            self.bounce(object_box)
+        return collision_detected
 
-            if offset < 0.5:
-                offset *= 2
-                flag = True
-            else:
-                offset = -1 - (offset - 0.5) * -2
+    def bounce(self, object_box):
+        offset = (self.box.centerx - object_box.left) / object_box.width
+        flag = False
 
-            angle = offset * 90
-            min_angle = 30
+        if offset <= 0:
+            offset = 0
+        elif offset >= 1:
+            offset = 1
 
-            if angle < 30:
-                if flag:
-                    angle = min_angle
-                elif -angle < min_angle:
-                    angle = -min_angle
+        if offset < 0.5:
+            offset *= 2
+            flag = True
+        else:
+            offset = -1 - (offset - 0.5) * -2
 
-            radians = math.radians(angle)
+        angle = offset * 90
+        min_angle = 30
 
+        if angle < 30:
             if flag:
-                self.dy = self.speed * -math.sin(radians)
-                self.dx = self.speed * -math.cos(radians)
-            else:
-                self.dy = self.speed * math.sin(radians)
-                self.dx = self.speed * math.cos(radians)
+                angle = min_angle
+            elif -angle < min_angle:
+                angle = -min_angle
 
-            speed_magnitude = math.sqrt(self.dx ** 2 + self.dy ** 2)
-            self.y = object_box.y - 20
-            self.dx = (self.dx / speed_magnitude*1.5) * self.speed
-            self.dy = (self.dy / speed_magnitude*1.5) * self.speed
-        return collision_detected
+        radians = math.radians(angle)
+
+        if flag:
+            self.dy = self.speed * -math.sin(radians)
+            self.dx = self.speed * -math.cos(radians)
+        else:
+            self.dy = self.speed * math.sin(radians)
+            self.dx = self.speed * math.cos(radians)
+
+        speed_magnitude = math.sqrt(self.dx ** 2 + self.dy ** 2)
+        self.y = object_box.y - 20
+        self.dx = (self.dx / speed_magnitude*1.5) * self.speed
+        self.dy = (self.dy / speed_magnitude*1.5) * self.speed
 
     def reset(self):
         self.dx = self.speed
         self.dy = -self.speed
         self.update_position((0, 500),'h')
         self.x, self.y = self.box.topleft
+        self.previous = None
+
+    def respawn(self):
+        self.activate()
+        if self.fireball:
+            self.deactive_fireball()
+        self.reset()
 
     def active_fireball(self):
         self.fireball_mask = Sprite(self.window,self.parent,(1216,24,452,109),(50,20),(0,0),center='h')
-        self.fireball_animation_timer = time.time()
-        self.fireball_timer = time.time()
+        self.fireball_clock = 0
+        self.fireball_timer = self.fireball_duration
         self.fireball = True
 
     def deactive_fireball(self):
         self.fireball_mask = None
-        self.fireball_animation_timer = None
         self.fireball = False
 
     def update_fireball_animation(self):
-        if self.fireball_animation_timer and time.time() - self.fireball_animation_timer >= self.fireball_animation_rate:
-            if self.fireball_stage >= len(self.fireball_stages) - 1:
-                self.fireball_stage = 0
-            self.fireball_stage += 1
-            self.fireball_mask.update_sprite(self.fireball_stages[self.fireball_stage],size = (50,20),rotation=self.fireball_animation_angle)
-            self.fireball_animation_timer = time.time()
-
-        if self.dx > 0 and self.dy < 0:
-            self.fireball_animation_angle = 225
-            self.fireball_mask.update_position((self.x-33,self.y+8))
-        elif self.dx < 0 and self.dy < 0:
-            self.fireball_animation_angle = 315
-            self.fireball_mask.update_position((self.x+6,self.y+4))
-        elif self.dx > 0 and self.dy > 0:
-            self.fireball_animation_angle = 135
-            self.fireball_mask.update_position((self.x-36,self.y-34))
-        elif self.dx < 0 and self.dy > 0:
-            self.fireball_animation_angle = 45
-            self.fireball_mask.update_position((self.x+5,self.y-35))
-        elif self.dx == 0 and self.dy > 0:
-            self.fireball_animation_angle = 90
-            self.fireball_mask.update_position((self.x,self.y-40))
-        elif self.dx == 0 and self.dy < 0:
-            self.fireball_animation_angle = 270
-            self.fireball_mask.update_position((self.x+2, self.y+15))
+        pose = self.fireball_poses.get(((self.dx > 0) - (self.dx < 0), (self.dy > 0) - (self.dy < 0)))
+        if pose is None:
+            return
+        angle, offset = pose
+        self.fireball_mask.set_frame(fireball_animation.frame(self.fireball_clock, angle))
+        self.fireball_mask.update_position((self.x + offset[0], self.y + offset[1]))
 
 
 class Block(Sprite):
     def __init__(self, window, parent, position, stamina):
         super().__init__(window, parent, (26, 23 + (101 * (stamina - 1)), 227, 75), (70, 25), position)
         self.stamina = stamina
+        self.cell = None
 
     def hit(self):
         self.stamina -= 1
         if self.stamina == 0:
             return True
-        self.update_sprite((26, 23 + (101 * (self.stamina - 1)), 227, 75))
+        self.set_stamina(self.stamina)
         return False
 
+    def set_stamina(self, stamina):
+        self.stamina = stamina
+        self.update_sprite((26, 23 + (101 * (stamina - 1)), 227, 75))
+
+
+class BrickLayer:
+    def __init__(self, size, blocks):
+        self.surface = pygame.surface.Surface(size)
+        for block in blocks:
+            self.surface.blit(block.tool, block.box)
+
+    def repaint(self, block, visible=True):
+        # Bricks fill their grid cell, so repainting one never touches a neighbour.
+        self.surface.fill((0, 0, 0), block.box)
+        if visible:
+            self.surface.blit(block.tool, block.box)
+        return block.box.copy()
+
+
+class Reward(EntityView, Sprite):
+    sprite_map = {
+        '+50': (531,181,203,54),
+        '+100': (760, 181, 203, 54),
+        '+250': (988, 185, 203, 54),
+        '+500': (529, 262, 203, 54),
+        'slow': (757, 261, 203, 54),
+        'fast': (988, 262, 203, 54),
+        '+ball': (529, 341, 203, 54),
+        'fireball': (756, 341, 203, 54),
+        '-size': (531, 420, 203, 54),
+        '+size': (758, 420, 203, 54),
+        'shooter': (986, 420, 203, 54),
+        '+life': (531,499,204,54)
+    }
+
+    def __init__(self,window,parent,entities,position,rng=random):
+        super().__init__(window,parent,self.sprite_map['+50'],(70,20),(0,0))
+        self.attach(entities, EntityStore.REWARD)
+        self.speed = 3
+        self.respawn(position, rng)
 
-class Reward(Sprite):
-    def __init__(self,window,parent,position):
-        sprite_map = {
-            '+50': (531,181,203,54),
-            '+100': (760, 181, 203, 54),
-            '+250': (988, 185, 203, 54),
-            '+500': (529, 262, 203, 54),
-            'slow': (757, 261, 203, 54),
-            'fast': (988, 262, 203, 54),
-            '+ball': (529, 341, 203, 54),
-            'fireball': (756, 341, 203, 54),
-            '-size': (531, 420, 203, 54),
-            '+size': (758, 420, 203, 54),
-            'shooter': (986, 420, 203, 54),
-            '+life': (531,499,204,54)
-        }
-        reward = random.choice(list(sprite_map.items()))
-        self.sprite = reward[1]
-        self.name = reward[0]
-        super().__init__(window,parent,self.sprite,(70,20),(0,0))
+    def respawn(self, position, rng=random):
+        self.set_kind(rng.choice(list(self.sprite_map)))
         self.box.midtop = position
+        self.activate()
 
-        self.y = self.box.y
-        self.speed = 3
-        self.freeze = False
+        self.x, self.y = self.box.topleft
+        self.dx, self.dy = 0, self.speed
+        self.previous = None
 
-    def draw(self):
-        if not self.freeze:
-            self.move()
-        super().draw()
+    def set_kind(self, name):
+        self.name = name
+        self.sprite = self.sprite_map[name]
+        self.update_sprite(self.sprite, (70, 20))
 
-    def move(self):
-        self.y += self.speed
-        self.update_position((self.box.x, self.y))
+    def update(self, dt):
+        self.store_position()
 
     def check_collision(self,objet_rect):
         if self.box.colliderect(objet_rect):
@@ -324,21 +460,21 @@ class Reward(Sprite):
         else:
             return False
 
-class Bullet(Sprite):
-    def __init__(self,window,parent,position):
+class Bullet(EntityView, Sprite):
+    def __init__(self,window,parent,entities,position):
         super().__init__(window,parent,(1116,856,14,31),(10,20),position)
-        self.y = self.box.y
+        self.attach(entities, EntityStore.BULLET)
         self.speed = 4
-        self.sound = pygame.mixer.Sound('assets/sound/shot.wav')
-        self.sound.play().set_volume(self.parent.parent.fx_volume)
 
-    def draw(self):
-        self.move()
-        super().draw()
+    def respawn(self, position):
+        self.update_position(position)
+        self.activate()
+        self.x, self.y = self.box.topleft
+        self.dx, self.dy = 0, -self.speed
+        self.previous = None
 
-    def move(self):
-        self.y -= self.speed
-        self.box.y = self.y
+    def update(self, dt):
+        self.store_position()
 
     def check_collision(self, objet_rect):
         if self.box.colliderect(objet_rect):
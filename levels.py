@@ -0,0 +1,128 @@
+import json
+import mmap
+import os
+import struct
+import sys
+
+
+class LevelPack:
+    """
+    The LevelPack class reads levels from a compiled binary pack that is memory-mapped on first use.
+    The pack starts with a header (magic, version, columns, level count), followed by an index of
+    (name, offset, rows) entries and the level grids, one byte per cell and a fixed number of columns per row.
+    assets/data.json stays the authoring format; the pack is rebuilt from it whenever it is missing or stale.
+    """
+    magic = b'BRKL'
+    version = 1
+    header = struct.Struct('<4sHHI')
+    entry = struct.Struct('<16sIH')
+
+    def __init__(self, path='assets/levels.bin', source='assets/data.json', columns=10):
+        """
+        Create a closed pack; nothing is read until open, names or load is called.
+        """
+        self.path = path
+        self.source = source
+        self.columns = columns
+        self.file = None
+        self.data = None
+        self.index = {}
+
+    @classmethod
+    def compile(cls, source, path, columns=10):
+        """
+        Compile the levels of a JSON source file into a binary pack at path.
+        Rows holding a single value are repeated across the full width, as in the authoring format.
+        """
+        with open(source, mode='r') as data_file:
+            levels = json.load(data_file)['levels']
+
+        entries, grids = [], []
+        offset = cls.header.size + cls.entry.size * len(levels)
+        name_size = cls.entry.size - struct.calcsize('<IH')
+        for name, rows in levels.items():
+            if len(name.encode('ascii')) > name_size:
+                raise ValueError(f'{name}: level names must be at most {name_size} bytes')
+            grid = bytearray()
+            for row in rows:
+                row = row * columns if len(row) == 1 else row
+                if len(row) != columns:
+                    raise ValueError(f'{name}: rows must hold 1 or {columns} cells, got {len(row)}')
+                grid.extend(row)
+            entries.append(cls.entry.pack(name.encode('ascii'), offset, len(rows)))
+            grids.append(grid)
+            offset += len(grid)
+
+        # Written next to the target and swapped in so concurrent readers never see a partial pack.
+        temporary = f'{path}.{os.getpid()}.tmp'
+        with open(temporary, mode='wb') as pack_file:
+            pack_file.write(cls.header.pack(cls.magic, cls.version, columns, len(entries)))
+            pack_file.write(b''.join(entries))
+            pack_file.write(b''.join(grids))
+        os.replace(temporary, path)
+
+    def stale(self):
+        """
+        Return True when the pack is missing, older than its source or written by another version.
+        """
+        if not os.path.exists(self.path):
+            return True
+        if os.path.exists(self.source) and os.path.getmtime(self.source) > os.path.getmtime(self.path):
+            return True
+        with open(self.path, mode='rb') as pack_file:
+            head = pack_file.read(self.header.size)
+        if len(head) < self.header.size:
+            return True
+        magic, version, columns, count = self.header.unpack(head)
+        return magic != self.magic or version != self.version or columns != self.columns
+
+    def open(self):
+        """
+        Rebuild the pack if needed, map it into memory and read its index; the grids stay on disk.
+        """
+        if self.data is not None:
+            return
+        if self.stale():
+            self.compile(self.source, self.path, self.columns)
+        self.file = open(self.path, mode='rb')
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, columns, count = self.header.unpack_from(self.data, 0)
+        self.index = {}
+        for n in range(count):
+            name, offset, rows = self.entry.unpack_from(self.data, self.header.size + n * self.entry.size)
+            self.index[name.rstrip(b'\0').decode('ascii')] = (offset, rows)
+
+    def close(self):
+        """
+        Unmap the pack.
+        """
+        if self.data is not None:
+            self.data.close()
+            self.file.close()
+            self.data = None
+            self.file = None
+
+    def names(self):
+        """
+        Return the level names in authoring order.
+        """
+        self.open()
+        return list(self.index)
+
+    def load(self, name):
+        """
+        Return the grid of a level as a list of rows of cell values, reading only that level from the pack.
+        """
+        self.open()
+        offset, rows = self.index[name]
+        return [self.data[offset + r * self.columns:offset + (r + 1) * self.columns] for r in range(rows)]
+
+
+level_pack = LevelPack()
+
+
+if __name__ == '__main__':
+    source = sys.argv[1] if len(sys.argv) > 1 else level_pack.source
+    path = sys.argv[2] if len(sys.argv) > 2 else level_pack.path
+    LevelPack.compile(source, path)
+    print(f'compiled {source} into {path}')
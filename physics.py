@@ -0,0 +1,218 @@
+import math
+import numpy as np
+from profiler import profiler
+
+
+def sweep(box, dx, dy, target):
+    """
+    Cast box (x, y, w, h) along (dx, dy) against target and return (time, normal) of the first contact.
+    Time is the fraction of the move in [0, 1]; None is returned when there is no contact within the move
+    or the boxes already overlap.
+    """
+    profiler.count('collisions')
+    x, y, w, h = box
+    if dx > 0:
+        x_entry, x_exit = (target.left - x - w) / dx, (target.right - x) / dx
+    elif dx < 0:
+        x_entry, x_exit = (target.right - x) / dx, (target.left - x - w) / dx
+    elif target.left < x + w and x < target.right:
+        x_entry, x_exit = -math.inf, math.inf
+    else:
+        return None
+
+    if dy > 0:
+        y_entry, y_exit = (target.top - y - h) / dy, (target.bottom - y) / dy
+    elif dy < 0:
+        y_entry, y_exit = (target.bottom - y) / dy, (target.top - y - h) / dy
+    elif target.top < y + h and y < target.bottom:
+        y_entry, y_exit = -math.inf, math.inf
+    else:
+        return None
+
+    entry = max(x_entry, y_entry)
+    if entry < 0 or entry > 1 or entry >= min(x_exit, y_exit):
+        return None
+    if x_entry > y_entry:
+        return entry, (-1 if dx > 0 else 1, 0)
+    return entry, (0, -1 if dy > 0 else 1)
+
+
+class BrickGrid:
+    """
+    The BrickGrid class indexes the blocks of a level by the grid cell they occupy.
+    Their rects are also kept in a NumPy array so many moving rects can be tested against every block at once.
+    """
+    def __init__(self, origin=(75, 35), cell_size=(70, 25), columns=10):
+        """
+        Initialize an empty grid whose cell (0, 0) starts at origin.
+        """
+        self.origin = origin
+        self.cell_size = cell_size
+        self.columns = columns
+        self.rows = 0
+        self.cells = {}
+        self.ordered = []
+        self.boxes = None
+        self.alive = None
+
+    def __len__(self):
+        return len(self.cells)
+
+    def __contains__(self, block):
+        return self.cells.get(block.cell) is block
+
+    def __iter__(self):
+        return iter(list(self.cells.values()))
+
+    def cell_of(self, position):
+        """
+        Return the (row, column) cell containing a point in surface coordinates.
+        """
+        return ((position[1] - self.origin[1]) // self.cell_size[1],
+                (position[0] - self.origin[0]) // self.cell_size[0])
+
+    def add(self, block):
+        """
+        Store a block in the cell under its top-left corner.
+        """
+        block.cell = self.cell_of(block.box.topleft)
+        self.cells[block.cell] = block
+        self.rows = max(self.rows, block.cell[0] + 1)
+        self.boxes = None
+
+    def remove(self, block):
+        """
+        Drop a block from the grid in O(1).
+        """
+        if self.cells.get(block.cell) is block:
+            del self.cells[block.cell]
+            if self.boxes is not None:
+                self.alive[block.index] = False
+
+    def clear(self):
+        """
+        Remove every block from the grid.
+        """
+        self.cells.clear()
+        self.rows = 0
+        self.boxes = None
+
+    def build_boxes(self):
+        """
+        Rebuild the array of block rects in row-major order after blocks were added.
+        """
+        self.ordered = [self.cells[cell] for cell in sorted(self.cells)]
+        for index, block in enumerate(self.ordered):
+            block.index = index
+        self.boxes = np.array([tuple(block.box) for block in self.ordered], dtype=float).reshape(-1, 4)
+        self.alive = np.ones(len(self.ordered), dtype=bool)
+
+    def overlaps(self, rects):
+        """
+        Return, for every rect, the blocks it overlaps in row-major order; all pairs are tested in one pass.
+        """
+        if not rects:
+            return []
+        if self.boxes is None:
+            self.build_boxes()
+        rects = np.array([tuple(rect) for rect in rects], dtype=float).reshape(-1, 4)
+        left = np.maximum(rects[:, None, 0], self.boxes[None, :, 0])
+        right = np.minimum(rects[:, None, 0] + rects[:, None, 2], self.boxes[None, :, 0] + self.boxes[None, :, 2])
+        top = np.maximum(rects[:, None, 1], self.boxes[None, :, 1])
+        bottom = np.minimum(rects[:, None, 1] + rects[:, None, 3], self.boxes[None, :, 1] + self.boxes[None, :, 3])
+        hits = (left < right) & (top < bottom) & self.alive[None, :]
+        profiler.count('collisions', hits.size)
+        return [[self.ordered[index] for index in np.flatnonzero(row)] for row in hits]
+
+
+class EntityStore:
+    """
+    The EntityStore class keeps position, velocity, size and flags of every moving entity in parallel
+    NumPy arrays so balls, bullets and rewards can be moved and tested against the walls in bulk.
+    Game objects attach to a slot and read and write their state through it.
+    """
+    BALL, BULLET, REWARD = 1, 2, 3
+    ACTIVE, FROZEN = 1, 2
+
+    def __init__(self, capacity=64):
+        """
+        Allocate arrays for capacity entities; every slot starts free and inactive.
+        """
+        self.capacity = capacity
+        self.x = np.zeros(capacity)
+        self.y = np.zeros(capacity)
+        self.dx = np.zeros(capacity)
+        self.dy = np.zeros(capacity)
+        self.w = np.zeros(capacity)
+        self.h = np.zeros(capacity)
+        self.kind = np.zeros(capacity, dtype=np.uint8)
+        self.flags = np.zeros(capacity, dtype=np.uint8)
+        self.views = [None] * capacity
+        self.free = list(range(capacity - 1, -1, -1))
+
+    def allocate(self, view, kind):
+        """
+        Reserve a slot for view and return its index.
+        """
+        if not self.free:
+            raise RuntimeError(f'entity store is full ({self.capacity} entities)')
+        slot = self.free.pop()
+        self.views[slot] = view
+        self.kind[slot] = kind
+        self.flags[slot] = 0
+        return slot
+
+    def moving(self, kind):
+        """
+        Return a mask of the active, unfrozen entities of a kind.
+        """
+        return (self.kind == kind) & (self.flags == self.ACTIVE)
+
+    def step(self, kinds, scale):
+        """
+        Move every active, unfrozen entity of the given kinds by its velocity times scale; return the moved slots.
+        """
+        mask = np.zeros(self.capacity, dtype=bool)
+        for kind in kinds:
+            mask |= self.moving(kind)
+        self.x[mask] += self.dx[mask] * scale
+        self.y[mask] += self.dy[mask] * scale
+        return np.flatnonzero(mask)
+
+    def advance_within(self, kind, rect, scale):
+        """
+        Move the entities of a kind whose whole step stays inside rect, where nothing can be hit, and return
+        their slots; the others are left for swept collision.
+        """
+        mask = self.moving(kind)
+        reach = np.hypot(self.dx, self.dy) * scale + 1
+        mask &= ((self.x - reach >= rect.left) & (self.x + self.w + reach <= rect.right)
+                 & (self.y - reach >= rect.top) & (self.y + self.h + reach <= rect.bottom))
+        self.x[mask] += self.dx[mask] * scale
+        self.y[mask] += self.dy[mask] * scale
+        return np.flatnonzero(mask)
+
+    def above(self, kind, limit):
+        """
+        Return the slots of active entities of a kind that are entirely above limit.
+        """
+        return np.flatnonzero((self.kind == kind) & (self.flags & self.ACTIVE > 0) & (self.y + self.h < limit))
+
+    def below(self, kind, limit):
+        """
+        Return the slots of active entities of a kind whose top is below limit.
+        """
+        return np.flatnonzero((self.kind == kind) & (self.flags & self.ACTIVE > 0) & (self.y > limit))
+
+    def sync(self, slots):
+        """
+        Copy the positions of the given slots back to their views' rects.
+        """
+        for slot in slots:
+            self.views[slot].box.topleft = (float(self.x[slot]), float(self.y[slot]))
+
+    def views_of(self, slots):
+        """
+        Return the views attached to the given slots.
+        """
+        return [self.views[slot] for slot in slots]
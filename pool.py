@@ -0,0 +1,52 @@
+from profiler import profiler
+
+
+class ObjectPool:
+    """
+    The ObjectPool class recycles up to capacity objects instead of allocating a new one for every use.
+    Pooled objects implement respawn(*args) to reset themselves when they are handed out again
+    and retire() to stop taking part in the game when they are given back.
+    """
+    def __init__(self, factory, capacity):
+        """
+        Initialize an empty pool that builds objects with factory() on demand.
+        """
+        self.factory = factory
+        self.capacity = capacity
+        self.free = []
+        self.in_use = set()
+
+    def __len__(self):
+        return len(self.in_use)
+
+    def acquire(self, *args):
+        """
+        Return a respawned object, or None when every object of the pool is in use.
+        """
+        if self.free:
+            obj = self.free.pop()
+        elif len(self.in_use) < self.capacity:
+            obj = self.factory()
+            profiler.count('allocations')
+        else:
+            return None
+        obj.respawn(*args)
+        self.in_use.add(obj)
+        return obj
+
+    def release(self, obj):
+        """
+        Give an object back to the pool; releasing an object twice has no effect.
+        """
+        if obj in self.in_use:
+            self.in_use.remove(obj)
+            obj.retire()
+            self.free.append(obj)
+
+    def release_all(self, objects):
+        """
+        Release every object of a list and empty it.
+        """
+        for obj in objects:
+            self.release(obj)
+        objects.clear()
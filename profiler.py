@@ -0,0 +1,200 @@
+import csv
+import json
+import time
+from collections import Counter, deque
+import pygame
+
+
+class Phase:
+    """
+    The Phase class times one named phase of the current frame when used as a context manager.
+    """
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.profiler.phases[self.name] += time.perf_counter() - self.start
+        return False
+
+
+class NoPhase:
+    """
+    The NoPhase class stands in for Phase while profiling is off so instrumented code costs next to nothing.
+    """
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+class Profiler:
+    """
+    The Profiler class collects per-frame phase timings and event counters, keeps a rolling window
+    of recent frames for an on-screen overlay, and records every frame for export to a CSV or JSON trace.
+    It is off by default; instrumented code only pays for a flag check until enable is called.
+    """
+    buckets = (4, 8, 16.7, 25, 33.3, 50, 100)
+
+    def __init__(self, history=300):
+        """
+        Initialize a disabled profiler that keeps the last history frames for the overlay and histogram.
+        """
+        self.enabled = False
+        self.overlay = False
+        self.trace = None
+        self.history = deque(maxlen=history)
+        self.records = []
+        self.phases = Counter()
+        self.counters = Counter()
+        self.frame_start = None
+        self.frame_count = 0
+        self.no_phase = NoPhase()
+        self.font = None
+        self.overlay_size = (0, 0)
+
+    def enable(self, trace=None, overlay=False):
+        """
+        Start collecting; frames are also kept in full for export when trace names an output file.
+        """
+        self.enabled = True
+        self.overlay = overlay
+        self.trace = trace
+
+    def disable(self):
+        """
+        Stop collecting; recorded frames are kept until reset.
+        """
+        self.enabled = False
+        self.overlay = False
+        self.frame_start = None
+
+    def toggle_overlay(self):
+        """
+        Show or hide the overlay, collecting while it is shown; return True when it is now shown.
+        """
+        self.overlay = not self.overlay
+        self.enabled = self.overlay or bool(self.trace)
+        return self.overlay
+
+    def reset(self):
+        """
+        Drop every recorded frame.
+        """
+        self.history.clear()
+        self.records = []
+        self.frame_count = 0
+
+    def phase(self, name):
+        """
+        Return a context manager that adds the time spent inside it to phase name of the current frame.
+        """
+        if not self.enabled:
+            return self.no_phase
+        return Phase(self, name)
+
+    def count(self, name, amount=1):
+        """
+        Add amount to counter name of the current frame.
+        """
+        if self.enabled:
+            self.counters[name] += amount
+
+    def begin_frame(self):
+        """
+        Mark the start of a frame.
+        """
+        if self.enabled:
+            self.frame_start = time.perf_counter()
+            self.phases.clear()
+            self.counters.clear()
+
+    def end_frame(self):
+        """
+        Close the current frame and record its total time, phases and counters.
+        """
+        if not self.enabled or self.frame_start is None:
+            return
+        record = {'frame': self.frame_count, 'total_ms': (time.perf_counter() - self.frame_start) * 1000}
+        record.update({f'{name}_ms': seconds * 1000 for name, seconds in self.phases.items()})
+        record.update(self.counters)
+        self.frame_count += 1
+        self.history.append(record)
+        if self.trace:
+            self.records.append(record)
+
+    def histogram(self):
+        """
+        Return (upper bound in ms, frame count) pairs over the recent frames; the last bound is infinite.
+        """
+        counts = [0] * (len(self.buckets) + 1)
+        for record in self.history:
+            index = 0
+            while index < len(self.buckets) and record['total_ms'] > self.buckets[index]:
+                index += 1
+            counts[index] += 1
+        return list(zip((*self.buckets, float('inf')), counts))
+
+    def summary(self):
+        """
+        Return the mean total, phase times and counters over the recent frames.
+        """
+        totals = Counter()
+        for record in self.history:
+            totals.update({key: value for key, value in record.items() if key != 'frame'})
+        frames = len(self.history) or 1
+        return {key: value / frames for key, value in totals.items()}
+
+    def export(self, path=None):
+        """
+        Write the recorded frames to path (or the trace path), as JSON when it ends in .json and CSV otherwise.
+        """
+        path = path or self.trace
+        records = self.records or list(self.history)
+        if path.endswith('.json'):
+            with open(path, 'w') as trace_file:
+                json.dump({'frames': records, 'histogram': self.histogram(), 'summary': self.summary()},
+                          trace_file, indent=4)
+            return
+        columns = ['frame', 'total_ms']
+        for record in records:
+            columns.extend(key for key in record if key not in columns)
+        with open(path, 'w', newline='') as trace_file:
+            writer = csv.DictWriter(trace_file, columns, restval=0)
+            writer.writeheader()
+            writer.writerows(records)
+
+    def draw_overlay(self, window, position=(40, 80)):
+        """
+        Draw the recent averages and histogram in an opaque box and return the rect it covers.
+        """
+        summary = self.summary()
+        lines = [f'frame {summary.get("total_ms", 0):6.2f} ms']
+        lines.extend(f'{key[:-3]:<12}{value:6.2f} ms' for key, value in summary.items()
+                     if key.endswith('_ms') and key != 'total_ms')
+        lines.extend(f'{key:<18}{value:6.1f}' for key, value in summary.items() if not key.endswith('_ms'))
+        lines.extend(f'<= {bound:5.1f} ms {count:4d}' for bound, count in self.histogram())
+
+        if self.font is None:
+            self.font = pygame.font.SysFont('consolas', 16)
+        surfaces = [self.font.render(line, False, (255, 255, 255), (0, 0, 0)) for line in lines]
+        # The box only ever grows so a shorter line never leaves part of the previous overlay behind.
+        self.overlay_size = (max(self.overlay_size[0], max(surface.get_width() for surface in surfaces) + 10),
+                             max(self.overlay_size[1], sum(surface.get_height() for surface in surfaces) + 10))
+        box = pygame.rect.Rect(position, self.overlay_size)
+        window.fill((0, 0, 0), box)
+        y = box.y + 5
+        for surface in surfaces:
+            window.blit(surface, (box.x + 5, y))
+            y += surface.get_height()
+        pygame.draw.rect(window, (255, 255, 255), box, width=1)
+        return box
+
+
+profiler = Profiler()
@@ -0,0 +1,273 @@
+import bisect
+import json
+import os
+import time
+
+
+class RankedIndex:
+    """
+    The RankedIndex class keeps records sorted by a key so pages are slices and ranks are bisects.
+    """
+    def __init__(self, key):
+        """
+        Initialize an empty index ordered by key(record).
+        """
+        self.key = key
+        self.keys = []
+        self.records = []
+
+    def __len__(self):
+        return len(self.records)
+
+    @classmethod
+    def build(cls, records, key):
+        """
+        Return an index over records, sorted in one pass.
+        """
+        index = cls(key)
+        index.records = sorted(records, key=key)
+        index.keys = [key(record) for record in index.records]
+        return index
+
+    def insert(self, record):
+        """
+        Insert a record after every record with an equal key and return its position.
+        """
+        key = self.key(record)
+        position = bisect.bisect_right(self.keys, key)
+        self.keys.insert(position, key)
+        self.records.insert(position, record)
+        return position
+
+    def remove(self, record):
+        """
+        Remove a record, found by its key among the records with an equal key.
+        """
+        position = bisect.bisect_left(self.keys, self.key(record))
+        while self.records[position] is not record:
+            position += 1
+        del self.keys[position]
+        del self.records[position]
+
+    def page(self, offset, count):
+        """
+        Return count records starting at offset.
+        """
+        return self.records[offset:offset + count]
+
+    def position(self, key):
+        """
+        Return how many records sort before key.
+        """
+        return bisect.bisect_left(self.keys, key)
+
+
+class RecordStore:
+    """
+    The RecordStore class keeps every finished game in an append-only JSON-lines log, one record per line.
+    Saving a score appends and fsyncs a single line; a line cut short by a crash is skipped on load and
+    dropped at the next compaction, which rewrites the log to a temporary file and swaps it in atomically.
+    In memory the records are indexed by score, by score within each level, by score within each recent
+    time window and by time, so leaderboard pages are slices and ranks are bisect lookups.
+    """
+    def __init__(self, path='assets/records.jsonl', legacy='assets/data.json'):
+        """
+        Create an unloaded store; records from the legacy data file are imported the first time the log is created.
+        """
+        self.path = path
+        self.legacy = legacy
+        self.ranked = RankedIndex(self.key)
+        self.timeline = RankedIndex(self.moment)
+        self.levels = {}
+        self.windows = {}
+        self.loaded = False
+
+    def __len__(self):
+        self.load()
+        return len(self.ranked)
+
+    @staticmethod
+    def key(record):
+        """
+        Sort key: higher points first, then earlier records first.
+        """
+        return -record['points'], record['time']
+
+    @staticmethod
+    def moment(record):
+        """
+        Timeline key: when the record was saved.
+        """
+        return record['time']
+
+    def insert(self, record):
+        """
+        Add a record to every in-memory index.
+        """
+        self.ranked.insert(record)
+        position = self.timeline.insert(record)
+        for window in self.windows.values():
+            # A record older than those already aged out of a window never enters it.
+            if position < window[1]:
+                window[1] += 1
+            else:
+                window[0].insert(record)
+        if record.get('level'):
+            self.levels.setdefault(record['level'], RankedIndex(self.key)).insert(record)
+
+    def clear_indexes(self):
+        """
+        Empty every in-memory index.
+        """
+        self.ranked = RankedIndex(self.key)
+        self.timeline = RankedIndex(self.moment)
+        self.levels = {}
+        self.windows = {}
+
+    def load(self, reload=False):
+        """
+        Read the log into memory, once; compact it if it held unreadable lines.
+        """
+        if self.loaded and not reload:
+            return
+        self.clear_indexes()
+        self.loaded = True
+        if not os.path.exists(self.path):
+            self.import_legacy()
+            return
+
+        damaged = False
+        with open(self.path, mode='r', encoding='utf-8') as log_file:
+            for line in log_file:
+                try:
+                    record = json.loads(line)
+                    record['points'], record['name'], record.setdefault('time', 0)
+                except (ValueError, KeyError, TypeError):
+                    damaged = True
+                    continue
+                self.insert(record)
+        if damaged:
+            self.compact()
+
+    def import_legacy(self):
+        """
+        Seed a new log with the named records kept in the legacy data file, if any.
+        """
+        records = []
+        if os.path.exists(self.legacy):
+            with open(self.legacy, mode='r') as data_file:
+                records = json.load(data_file).get('records', [])
+        for points, name in records:
+            if name != 'None':
+                self.insert({'points': points, 'name': name, 'time': 0})
+        self.compact()
+
+    def add(self, points, name, **fields):
+        """
+        Append a record to the log, flushed to disk, and index it; return the record.
+        Extra fields are stored with it.
+        """
+        self.load()
+        record = {'points': points, 'name': name, 'time': time.time(), **fields}
+        with open(self.path, mode='a', encoding='utf-8') as log_file:
+            log_file.write(json.dumps(record) + '\n')
+            log_file.flush()
+            os.fsync(log_file.fileno())
+        self.insert(record)
+        return record
+
+    def compact(self, keep=None):
+        """
+        Atomically rewrite the log with the indexed records, or only the best keep of them.
+        """
+        self.load()
+        records = self.timeline.records
+        if keep is not None:
+            kept = {id(record) for record in self.ranked.page(0, keep)}
+            records = [record for record in records if id(record) in kept]
+            self.clear_indexes()
+            for record in records:
+                self.insert(record)
+        temporary = f'{self.path}.tmp'
+        with open(temporary, mode='w', encoding='utf-8') as log_file:
+            for record in records:
+                log_file.write(json.dumps(record) + '\n')
+            log_file.flush()
+            os.fsync(log_file.fileno())
+        os.replace(temporary, self.path)
+
+    def window(self, seconds):
+        """
+        Return the index of the games saved in the last seconds. It is built once per window length, then
+        kept up to date: new records are inserted as they are added and old ones removed as they age out.
+        """
+        self.load()
+        cutoff = time.time() - seconds
+        window = self.windows.get(seconds)
+        if window is None:
+            start = bisect.bisect_left(self.timeline.keys, cutoff)
+            window = self.windows[seconds] = [RankedIndex.build(self.timeline.records[start:], self.key), start]
+        index, start = window
+        while start < len(self.timeline) and self.timeline.keys[start] < cutoff:
+            index.remove(self.timeline.records[start])
+            start += 1
+        window[1] = start
+        return index
+
+    def view(self, level=None, window=None):
+        """
+        Return the index of the records of one level, of the games played in the last window seconds, or of all games.
+        """
+        self.load()
+        if level is not None:
+            return self.levels.get(level, RankedIndex(self.key))
+        if window is not None:
+            return self.window(window)
+        return self.ranked
+
+    def top(self, count, offset=0, level=None, window=None):
+        """
+        Return a page of count records from offset, best first.
+        """
+        return self.view(level, window).page(offset, count)
+
+    def count(self, level=None, window=None):
+        """
+        Return the number of records in a view.
+        """
+        return len(self.view(level, window))
+
+    def rank(self, points, level=None, window=None):
+        """
+        Return the position (1 for the best) a score of points would take, ties going to the older records.
+        """
+        return bisect.bisect_right(self.view(level, window).keys, (-points, float('inf'))) + 1
+
+    def position(self, record, level=None, window=None):
+        """
+        Return the position (1 for the best) of a stored record in a view.
+        """
+        return self.view(level, window).position(self.key(record)) + 1
+
+    def level_bests(self):
+        """
+        Return the best record of every level, best first.
+        """
+        self.load()
+        return sorted((index.records[0] for index in self.levels.values()), key=self.key)
+
+    def latest(self):
+        """
+        Return the most recent record, or None.
+        """
+        self.load()
+        return self.timeline.records[-1] if self.timeline.records else None
+
+    def qualifies(self, points, count):
+        """
+        Return True when a score of points would enter the top count.
+        """
+        return points > 0 and self.rank(points) <= count
+
+
+record_store = RecordStore()
@@ -0,0 +1,170 @@
+import argparse
+import json
+import struct
+from game_objects import Controls
+
+
+class Recording:
+    """
+    The Recording class holds everything needed to replay a game: its seed, start level and tick rate,
+    and the Controls of every simulation tick stored as runs of identical input.
+    On disk it is a small header followed by one (input bits, varint run length) pair per run.
+    """
+    magic = b'BRKR'
+    version = 2
+    header = struct.Struct('<4sHqHI')
+
+    def __init__(self, seed, level=None, tick_rate=60):
+        """
+        Initialize an empty recording of a game started with seed on level (None for a random level).
+        """
+        self.seed = seed
+        self.level = level
+        self.tick_rate = tick_rate
+        self.runs = []
+        self.ticks = 0
+
+    @staticmethod
+    def pack(controls):
+        """
+        Return the input bits of a Controls: 1 for left, 2 for right and 4 for shoot.
+        """
+        return bool(controls.left) | bool(controls.right) << 1 | bool(controls.shoot) << 2
+
+    @staticmethod
+    def unpack(bits):
+        """
+        Return the Controls for a set of input bits.
+        """
+        return Controls(bool(bits & 1), bool(bits & 2), bool(bits & 4))
+
+    def record(self, controls):
+        """
+        Append the input of one tick.
+        """
+        bits = self.pack(controls)
+        if self.runs and self.runs[-1][0] == bits:
+            self.runs[-1][1] += 1
+        else:
+            self.runs.append([bits, 1])
+        self.ticks += 1
+
+    def truncate(self, ticks):
+        """
+        Drop the input recorded after the first ticks ticks.
+        """
+        while self.ticks > ticks:
+            drop = min(self.runs[-1][1], self.ticks - ticks)
+            self.runs[-1][1] -= drop
+            if not self.runs[-1][1]:
+                self.runs.pop()
+            self.ticks -= drop
+
+    def inputs(self):
+        """
+        Yield the Controls of every recorded tick in order.
+        """
+        for bits, count in self.runs:
+            controls = self.unpack(bits)
+            for tick in range(count):
+                yield controls
+
+    def encode(self):
+        """
+        Return the recording as bytes.
+        """
+        data = bytearray(self.header.pack(self.magic, self.version, self.seed, self.level or 0, self.tick_rate))
+        for bits, count in self.runs:
+            data.append(bits)
+            while count >= 0x80:
+                data.append(count & 0x7f | 0x80)
+                count >>= 7
+            data.append(count)
+        return bytes(data)
+
+    @classmethod
+    def decode(cls, data):
+        """
+        Rebuild a recording from bytes written by encode.
+        """
+        magic, version, seed, level, tick_rate = cls.header.unpack_from(data, 0)
+        if magic != cls.magic or version != cls.version:
+            raise ValueError(f'not a version {cls.version} replay')
+        recording = cls(seed, level or None, tick_rate)
+        position = cls.header.size
+        while position < len(data):
+            bits = data[position]
+            count, shift = 0, 0
+            while True:
+                position += 1
+                byte = data[position]
+                count |= (byte & 0x7f) << shift
+                shift += 7
+                if not byte & 0x80:
+                    break
+            position += 1
+            recording.runs.append([bits, count])
+            recording.ticks += count
+        return recording
+
+    def save(self, path):
+        """
+        Write the recording to a file.
+        """
+        with open(path, mode='wb') as replay_file:
+            replay_file.write(self.encode())
+
+    @classmethod
+    def load(cls, path):
+        """
+        Read a recording from a file.
+        """
+        with open(path, mode='rb') as replay_file:
+            return cls.decode(replay_file.read())
+
+
+def play_headless(recording):
+    """
+    Replay a recording without a window as fast as possible and return the final state of the game.
+    """
+    from simulation import Simulation
+    simulation = Simulation(level=recording.level, seed=recording.seed, tick_rate=recording.tick_rate)
+    for controls in recording.inputs():
+        if not simulation.step(controls):
+            break
+    return simulation.state()
+
+
+def play_on_screen(recording):
+    """
+    Replay a recording in the game window at its recorded tick rate.
+    """
+    from asset_manager import asset_manager
+    from core import Core
+    from frames import Game
+    break_out = Core(900, 700, 'BreakOut replay', 'assets/img/icon.png', tick_rate=recording.tick_rate)
+    break_out.session_path = None
+    break_out.initialize()
+    # The Loading frame is skipped here, so start decoding the sound effects before they are first played.
+    asset_manager.preload()
+    break_out.active_frame = Game(break_out.window, break_out, 0.1, level=recording.level, seed=recording.seed,
+                                  replay=recording.inputs())
+    break_out.run()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Inspect or play back a recorded BreakOut game.')
+    parser.add_argument('mode', choices=('info', 'run', 'play'),
+                        help='info: print the header; run: replay headless and print the final state; '
+                             'play: replay on screen')
+    parser.add_argument('path')
+    args = parser.parse_args()
+
+    replay = Recording.load(args.path)
+    if args.mode == 'info':
+        print(json.dumps({'seed': replay.seed, 'level': replay.level, 'tick_rate': replay.tick_rate,
+                          'ticks': replay.ticks, 'runs': len(replay.runs)}, indent=4))
+    elif args.mode == 'run':
+        print(json.dumps(play_headless(replay), indent=4))
+    else:
+        play_on_screen(replay)
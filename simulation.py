@@ -0,0 +1,83 @@
+import os
+import pygame
+from frames import Game
+from game_objects import Controls
+
+
+class Simulation:
+    """
+    The Simulation class drives the Game rules and physics without a window, sound or frame pacing.
+    """
+    def __init__(self, level=None, seed=None, tick_rate=60, width=900, height=700):
+        """
+        Initialize Pygame with dummy video and audio drivers and build a Game on an off-screen window.
+        seed feeds the Game's own random generator, so equal seeds and inputs replay the same game.
+        """
+        os.environ['SDL_VIDEODRIVER'] = 'dummy'
+        os.environ['SDL_AUDIODRIVER'] = 'dummy'
+        pygame.display.init()
+        pygame.font.init()
+
+        self.width = width
+        self.height = height
+        self.headless = True
+        self.record_dir = None
+        self.session_path = None
+        self.tick_rate = tick_rate
+        self.dt = 1 / tick_rate
+        self.ticks = 0
+        self.window = pygame.display.set_mode((width, height))
+        self.active_frame = None
+        self.game = Game(self.window, self, 0, level=level, seed=seed)
+        self.active_frame = self.game
+
+    @property
+    def done(self):
+        """
+        Return True once the game is over.
+        """
+        return self.game.game_state == 'over'
+
+    @property
+    def time(self):
+        """
+        Return the simulated time in seconds.
+        """
+        return self.ticks * self.dt
+
+    def step(self, inputs=None):
+        """
+        Advance the game by one tick with the given Controls (or a (left, right, shoot) tuple).
+        Return False once the game is over.
+        """
+        if self.done:
+            return False
+        self.game.game_objects['player'].controls = Controls(*inputs) if inputs else Controls()
+        self.game.update(self.dt)
+        self.ticks += 1
+        return not self.done
+
+    def run(self, policy, max_ticks):
+        """
+        Step the game with policy(simulation) -> inputs until it is over or max_ticks have passed.
+        """
+        while self.ticks < max_ticks and self.step(policy(self)):
+            pass
+        return self.state()
+
+    def state(self):
+        """
+        Return a plain snapshot of the game useful for assertions and bots.
+        """
+        player = self.game.game_objects['player']
+        return {
+            'ticks': self.ticks,
+            'time': self.time,
+            'state': self.game.game_state,
+            'lifes': self.game.lifes,
+            'points': self.game.points,
+            'bricks': len(self.game.blocks),
+            'paddle': player.box.centerx,
+            'balls': [(ball.x, ball.y, ball.dx, ball.dy) for ball in self.game.balls],
+            'rewards': [(reward.name, reward.box.centerx, reward.box.y) for reward in self.game.rewards],
+        }
@@ -0,0 +1,228 @@
+import math
+import os
+import random
+import struct
+from collections import deque
+from game_objects import Reward
+from levels import level_pack
+
+MAGIC = b'BRKS'
+VERSION = 4
+
+# Game: magic, version, seed, tick, level, next level (0xffff for none), remaining levels, lifes, points,
+# levels cleared, lifes lost, then the Mersenne Twister state and cached gauss value (NaN when empty).
+# Levels are numbered by their position in the level pack, followed by the remaining levels, one H each.
+GAME = struct.Struct('<4sHqIHHHBIHH625Id')
+NO_LEVEL = 0xffff
+# Player: paddle x, speed, paddle size, shooter, bullets left, shot cooldown (NaN when ready), bullets in flight.
+PLAYER = struct.Struct('<ddBBBdB')
+BULLET = struct.Struct('<dd')
+# Ball: x, y, dx, dy, speed, fireball, fireball time left, fireball clock.
+# A pause freeze is not game state and is never stored, so a restored game always plays on.
+BALL = struct.Struct('<dddddBdd')
+# Reward: kind, x, y.
+REWARD = struct.Struct('<Bdd')
+# Balls, rewards and bricks in the level, then how many rewards of each kind were collected.
+COUNTS = struct.Struct(f'<BBH{len(Reward.sprite_map)}H')
+
+REWARD_KINDS = list(Reward.sprite_map)
+REWARD_INDEX = {name: n for n, name in enumerate(REWARD_KINDS)}
+
+
+def optional(value):
+    """
+    Return value, or NaN for None, so optional timers fit a double field.
+    """
+    return math.nan if value is None else value
+
+
+def level_index():
+    """
+    Return the position of every level in the level pack, the numbering snapshots use for level names.
+    """
+    return {name: n for n, name in enumerate(level_pack.names())}
+
+
+def capture(game):
+    """
+    Return the state of a running Game as bytes: counters, random generator, paddle, balls, bullets,
+    rewards and the stamina of every brick of the level (0 once destroyed).
+    Sprites are not stored; restore rebuilds them from this state.
+    """
+    player = game.game_objects['player']
+    levels = level_index()
+    rng_version, rng_state, gauss = game.random.getstate()
+    next_level = levels[game.next_level_name] if game.next_level_name else NO_LEVEL
+    data = [
+        GAME.pack(MAGIC, VERSION, game.seed, game.recording.ticks, levels[game.level_name], next_level,
+                  len(game.levels), game.lifes, game.points, game.levels_cleared, game.lifes_lost,
+                  *rng_state, optional(gauss)),
+        struct.pack(f'<{len(game.levels)}H', *(levels[name] for name in game.levels)),
+        PLAYER.pack(player.x, player.speed, player.paddle_size, player.shooter, player.bullets_amount,
+                    optional(player.shooter_timer), len(player.bullets)),
+    ]
+    data.extend(BULLET.pack(bullet.x, bullet.y) for bullet in player.bullets)
+    data.append(COUNTS.pack(len(game.balls), len(game.rewards), len(game.level_blocks),
+                            *(game.rewards_collected[name] for name in REWARD_KINDS)))
+    data.extend(BALL.pack(ball.x, ball.y, ball.dx, ball.dy, ball.speed, ball.fireball,
+                          optional(ball.fireball_timer), ball.fireball_clock) for ball in game.balls)
+    data.extend(REWARD.pack(REWARD_INDEX[reward.name], reward.x, reward.y) for reward in game.rewards)
+    data.append(bytes(block.stamina if block in game.blocks else 0 for block in game.level_blocks))
+    return b''.join(data)
+
+
+def restore(game, data):
+    """
+    Put a Game back into the state captured in data; the snapshot may come from another Game instance.
+    Raise ValueError when data is not a snapshot of this version.
+    """
+    fields = GAME.unpack_from(data, 0)
+    magic, version, seed, tick, level, next_level, remaining, lifes, points, levels_cleared, lifes_lost = fields[:11]
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f'not a version {VERSION} snapshot')
+    gauss = fields[-1]
+    names = level_pack.names()
+    position = GAME.size
+
+    game.seed = seed
+    game.random.setstate((3, tuple(fields[11:-1]), None if math.isnan(gauss) else gauss))
+    game.levels = [names[n] for n in struct.unpack_from(f'<{remaining}H', data, position)]
+    position += 2 * remaining
+    game.lifes, game.points = lifes, points
+    game.levels_cleared, game.lifes_lost = levels_cleared, lifes_lost
+    game.game_objects['lifes'].set_duplicate(lifes)
+    game.game_objects['points'].set_value(points)
+
+    player = game.game_objects['player']
+    x, speed, paddle_size, shooter, bullets_amount, shooter_timer, bullets = PLAYER.unpack_from(data, position)
+    position += PLAYER.size
+    player.paddle_size = paddle_size
+    player.update_paddle()
+    player.x = x
+    player.box.x = round(x)
+    player.speed = speed
+    player.previous = None
+    player.bullet_pool.release_all(player.bullets)
+    player.shooter = False
+    if shooter:
+        player.set_shooter()
+        player.bullets_amount = bullets_amount
+        player.bullets_sprite.set_duplicate(bullets_amount)
+    player.shooter_timer = None if math.isnan(shooter_timer) else shooter_timer
+    for n in range(bullets):
+        x, y = BULLET.unpack_from(data, position)
+        position += BULLET.size
+        bullet = player.bullet_pool.acquire((x, y))
+        bullet.x, bullet.y = x, y
+        bullet.sync()
+        player.bullets.append(bullet)
+
+    balls, rewards, bricks, *collected = COUNTS.unpack_from(data, position)
+    position += COUNTS.size
+    game.rewards_collected.clear()
+    game.rewards_collected.update({name: count for name, count in zip(REWARD_KINDS, collected) if count})
+
+    surface = game.game_objects['game_surface']
+    for ball in game.balls:
+        surface.remove_object(ball)
+    game.ball_pool.release_all(game.balls)
+    for n in range(balls):
+        x, y, dx, dy, speed, fireball, fireball_timer, fireball_clock = BALL.unpack_from(data, position)
+        position += BALL.size
+        ball = game.ball_pool.acquire()
+        ball.x, ball.y, ball.dx, ball.dy, ball.speed = x, y, dx, dy, speed
+        ball.sync()
+        if fireball:
+            ball.active_fireball()
+            ball.fireball_timer, ball.fireball_clock = fireball_timer, fireball_clock
+            ball.update_fireball_animation()
+        game.balls.append(ball)
+        surface.add_object(ball, layer=1)
+
+    for reward in game.rewards:
+        surface.remove_object(reward)
+    game.reward_pool.release_all(game.rewards)
+    for n in range(rewards):
+        kind, x, y = REWARD.unpack_from(data, position)
+        position += REWARD.size
+        # The module-level generator picks a kind that is overwritten at once, leaving the game's untouched.
+        reward = game.reward_pool.acquire((0, 0), random)
+        reward.set_kind(REWARD_KINDS[kind])
+        reward.x, reward.y = x, y
+        reward.sync()
+        game.rewards.append(reward)
+        surface.add_object(reward)
+
+    game.restore_level(names[level], data[position:position + bricks])
+    game.restore_prefetch(None if next_level == NO_LEVEL else names[next_level])
+    game.full_redraw = True
+    return tick
+
+
+class SnapshotRing:
+    """
+    The SnapshotRing class keeps the snapshots of the last capacity * interval ticks of a game, one every
+    interval ticks, so play can be rewound to any of them at once.
+    """
+    def __init__(self, capacity=300, interval=6):
+        """
+        Initialize an empty ring; the defaults keep 30 seconds of play at 60 ticks per second.
+        """
+        self.interval = interval
+        self.snapshots = deque(maxlen=capacity)
+
+    def __len__(self):
+        return len(self.snapshots)
+
+    def push(self, snapshot):
+        """
+        Add the newest snapshot, dropping the oldest when the ring is full.
+        """
+        self.snapshots.append(snapshot)
+
+    def rewind(self, steps):
+        """
+        Drop the newest steps snapshots, keeping at least one, and return the newest one left (None when empty).
+        """
+        for n in range(min(steps, len(self.snapshots) - 1)):
+            self.snapshots.pop()
+        return self.snapshots[-1] if self.snapshots else None
+
+    def clear(self):
+        """
+        Drop every snapshot.
+        """
+        self.snapshots.clear()
+
+
+def save_snapshot(path, snapshot):
+    """
+    Write a snapshot to a file, swapped in atomically so a crash never leaves a partial one behind.
+    """
+    temporary = f'{path}.tmp'
+    with open(temporary, mode='wb') as snapshot_file:
+        snapshot_file.write(snapshot)
+        snapshot_file.flush()
+        os.fsync(snapshot_file.fileno())
+    os.replace(temporary, path)
+
+
+def load_snapshot(path):
+    """
+    Return the snapshot stored in a file, or None when there is none or it was written by another version.
+    """
+    if not os.path.exists(path):
+        return None
+    with open(path, mode='rb') as snapshot_file:
+        snapshot = snapshot_file.read()
+    if len(snapshot) < GAME.size or GAME.unpack_from(snapshot, 0)[:2] != (MAGIC, VERSION):
+        return None
+    return snapshot
+
+
+def delete_snapshot(path):
+    """
+    Delete a saved snapshot, if any.
+    """
+    if os.path.exists(path):
+        os.remove(path)
@@ -1,5 +1,109 @@
+import threading
 import time
+from collections import OrderedDict
 import pygame
+from profiler import profiler
+from asset_manager import asset_manager
+
+
+class SpriteAtlas:
+    def __init__(self, path):
+        self.path = path
+        self.sheet = None
+        self.frames = {}
+        # Levels are built on a loader thread while the game loop keeps drawing.
+        self.lock = threading.RLock()
+
+    def load(self):
+        with self.lock:
+            if self.sheet is None:
+                self.sheet = asset_manager.image(self.path)
+            return self.sheet
+
+    def get(self, sprite_rect, size=None, rotation=None):
+        key = (tuple(sprite_rect), tuple(size) if size else None, rotation or None)
+        frame = self.frames.get(key)
+        if frame is None:
+            with self.lock:
+                frame = self.frames.get(key)
+                if frame is None:
+                    if rotation:
+                        frame = pygame.transform.rotate(self.get(sprite_rect, size), rotation)
+                    elif size:
+                        frame = pygame.transform.scale(self.get(sprite_rect), size)
+                    else:
+                        frame = self.load().subsurface(sprite_rect)
+                    self.frames[key] = frame
+        return frame
+
+    def clear(self):
+        with self.lock:
+            self.frames.clear()
+
+
+sprite_atlas = SpriteAtlas('assets/img/sprite_sheet.png')
+
+
+class Animation:
+    def __init__(self, stages, size, rate, angles=(None,)):
+        self.stages = [tuple(stage) for stage in stages]
+        self.size = size
+        self.rate = rate
+        self.angles = angles
+        self.frames = {}
+
+    def bake(self):
+        # Every (angle, stage) frame is scaled and rotated once, up front.
+        if not self.frames:
+            self.frames = {angle: [sprite_atlas.get(stage, self.size, angle) for stage in self.stages]
+                           for angle in self.angles}
+
+    def frame(self, clock, angle=None):
+        self.bake()
+        frames = self.frames[angle]
+        return frames[int(clock / self.rate) % len(frames)]
+
+
+class TextCache:
+    def __init__(self, max_bytes=8 * 1024 * 1024):
+        self.fonts = {}
+        self.surfaces = OrderedDict()
+        self.max_bytes = max_bytes
+        self.used_bytes = 0
+
+    def get_font(self, face, size):
+        font = self.fonts.get((face, size))
+        if font is None:
+            font = pygame.font.SysFont(face, size)
+            self.fonts[(face, size)] = font
+        return font
+
+    def render(self, face, size, text, color, background=None):
+        key = (face, size, text, tuple(color), tuple(background) if background else None)
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.surfaces.move_to_end(key)
+            return surface
+
+        surface = self.get_font(face, size).render(text, False, color, background)
+        self.surfaces[key] = surface
+        self.used_bytes += self.surface_bytes(surface)
+        while self.used_bytes > self.max_bytes and len(self.surfaces) > 1:
+            _, evicted = self.surfaces.popitem(last=False)
+            self.used_bytes -= self.surface_bytes(evicted)
+        return surface
+
+    @staticmethod
+    def surface_bytes(surface):
+        return surface.get_height() * surface.get_pitch()
+
+    def clear(self):
+        self.surfaces.clear()
+        self.used_bytes = 0
+
+
+text_cache = TextCache()
+
 
 class Tool:
     def __init__(self, window, parent, size):
@@ -12,17 +116,29 @@ class Tool:
         self.box = pygame.rect.Rect(0, 0, 0, 0)
         self.tool = None
         self.border = None
+        self.drawn = []
 
     def event_handler(self, event):
         pass
 
+    def update(self, dt):
+        pass
+
+    def render(self, alpha=1.0):
+        self.draw()
+
     def draw(self):
         self.window.blit(self.tool, self.box)
+        profiler.count('blits')
+        self.drawn = [self.box.copy()]
         if self.border:
             pygame.draw.rect(self.window, (255, 255, 255),
                              (self.border[0][0], self.border[0][1], self.border[0][2], self.border[0][3]),
                              width=self.border[1])
 
+    def drawn_rects(self):
+        return self.drawn
+
     def set_border(self, width):
         self.border = [pygame.rect.Rect(self.box), width]
 
@@ -49,7 +165,7 @@ class Tool:
         return x, y
 
     def render_text(self, text, color):
-        return pygame.font.SysFont(self.font, self.size).render(text, False, color, (0, 0, 0))
+        return text_cache.render(self.font, self.size, text, color, (0, 0, 0))
 
 
 
@@ -65,6 +181,34 @@ class Label(Tool):
             self.set_center(center)
 
 
+class Counter(Tool):
+    def __init__(self, window, parent, value, size, color, position):
+        super().__init__(window, parent, size)
+        self.color = color
+        self.anchor = position
+        self.digits = [self.render_text(str(digit), self.color) for digit in range(10)]
+        self.glyphs = []
+        self.value = None
+        self.set_value(value)
+
+    def set_value(self, value):
+        if value == self.value:
+            return
+        self.value = value
+        self.glyphs = [self.digits[int(digit)] for digit in str(value)]
+        self.box.size = (sum(glyph.get_width() for glyph in self.glyphs),
+                         max(glyph.get_height() for glyph in self.glyphs))
+        self.box.topright = self.anchor
+
+    def draw(self):
+        x = self.box.x
+        for glyph in self.glyphs:
+            self.window.blit(glyph, (x, self.box.y))
+            x += glyph.get_width()
+        # The previous box stays listed so a shorter value also gets the old glyphs erased and pushed to the screen.
+        self.drawn = [self.box.copy(), *(rect for rect in self.drawn[:1] if rect != self.box)]
+
+
 class TextBox(Tool):
     def __init__(self, window, parent, placeholder, size, color, position, center='', limit=None):
         super().__init__(window, parent, size)
@@ -92,7 +236,7 @@ class TextBox(Tool):
                 self.text = self.text[:-1]
             elif key == 'space' and len(self.text) <= self.limit:
                 self.text += ' '
-            self.tool =  pygame.font.SysFont(self.font, self.size).render(self.text, False, self.color, (0, 0, 0))
+            self.tool = self.render_text(self.text, self.color)
             self.box.w, self.box.h = self.tool.get_size()
             self.set_center('h')
         if event.type == pygame.KEYUP:
@@ -113,30 +257,37 @@ class Button(Tool):
         self.hover_color = hover_color
         self.text = text
         self.action = action
+        self.hover = False
         self.tool = self.render_text(self.text, self.color)
         self.box = self.tool.get_rect(topleft=position)
         if center:
             self.set_center(center)
 
     def event_handler(self, event):
-        mouse_pos = pygame.mouse.get_pos()
+        mouse_pos = getattr(event, 'pos', None) or pygame.mouse.get_pos()
         if hasattr(self.parent, 'surface'):
             x, y = mouse_pos
             x -= self.parent.box.left
             y -= self.parent.box.top
             mouse_pos = (x, y)
-        if self.mouse_is_hover(mouse_pos):
-            self.tool = self.render_text(self.text, self.hover_color)
-            if event.type == pygame.MOUSEBUTTONDOWN:
-                self.action()
-        else:
-            self.tool = self.render_text(self.text, self.color)
+        hover = self.mouse_is_hover(mouse_pos)
+        if hover != self.hover:
+            self.hover = hover
+            self.tool = self.render_text(self.text, self.hover_color if hover else self.color)
+        if hover and event.type == pygame.MOUSEBUTTONDOWN:
+            self.action()
+
+    def set_text(self, text):
+        center = self.box.center
+        self.text = text
+        self.tool = self.render_text(self.text, self.hover_color if self.hover else self.color)
+        self.box = self.tool.get_rect(center=center)
 
 
 class Image(Tool):
     def __init__(self, window, parent, path, size, position, center='', action=None):
         super().__init__(window, parent, size)
-        self.data = pygame.image.load(path)
+        self.path = path
         self.action = action
         self.scale(self.size)
         self.box.update(position[0], position[1], self.data.get_size()[0], self.data.get_size()[1])
@@ -153,39 +304,55 @@ class Image(Tool):
                     self.action()
 
     def scale(self, new_size):
-        self.data = pygame.transform.scale(self.data, new_size)
+        # Decoded and scaled images are shared, so rebuilding a frame costs no disk reads or rescaling.
+        self.data = asset_manager.scaled(self.path, new_size)
 
 
 class Sprite(Tool):
     def __init__(self, window, parent, sprite_rect, size, position, center='', duplicate=-1):
         super().__init__(window, parent, size)
-        self.sprite_sheet = pygame.image.load('assets/img/sprite_sheet.png').convert_alpha()
-        self.data = self.get_sprite(*sprite_rect)
+        self.sprite_rect = tuple(sprite_rect)
+        self.data = self.get_sprite(*self.sprite_rect)
         self.scale(self.size)
         self.box.update(position[0], position[1], self.data.get_size()[0], self.data.get_size()[1])
         self.duplicate = duplicate
+        self.previous = None
         if center:
             self.set_center(center)
 
         self.tool = self.data
 
+    def store_position(self):
+        self.previous = self.box.topleft
+
+    def render(self, alpha=1.0):
+        if self.previous is None or alpha >= 1:
+            self.draw()
+            return
+        position = self.box.topleft
+        self.box.topleft = (round(self.previous[0] + (position[0] - self.previous[0]) * alpha),
+                            round(self.previous[1] + (position[1] - self.previous[1]) * alpha))
+        self.draw()
+        self.box.topleft = position
+
     def draw(self):
         if self.duplicate != -1:
             for n in range(self.duplicate):
                 self.window.blit(self.tool, (self.box.x + (self.box.w + 10) * n, self.box.y, self.box.w, self.box.h))
+            profiler.count('blits', self.duplicate)
+            width = (self.box.w + 10) * self.duplicate - 10
+            self.drawn = [pygame.rect.Rect(self.box.topleft, (width, self.box.h))] if self.duplicate > 0 else []
         else:
             super().draw()
 
     def get_sprite(self, x, y, width, height):
-        sprite = pygame.Surface((width, height), pygame.SRCALPHA)
-        sprite.blit(self.sprite_sheet, (0, 0), (x, y, width, height))
-        return sprite
+        return sprite_atlas.get((x, y, width, height))
 
     def set_duplicate(self, amount):
         self.duplicate = amount
 
     def scale(self, new_size):
-        self.data = pygame.transform.scale(self.data, new_size)
+        self.data = sprite_atlas.get(self.sprite_rect, new_size)
         self.box.size = new_size
         self.tool = self.data
 
@@ -199,16 +366,78 @@ class Sprite(Tool):
             self.set_center(center)
 
     def update_sprite(self, sprite_rect, size=None, rotation=None):
-        self.data = self.get_sprite(*sprite_rect)
+        self.sprite_rect = tuple(sprite_rect)
         if size is None:
             size = self.box.size
-        self.scale(size)
-        if rotation:
-            self.data = pygame.transform.rotate(self.data, rotation)
+        self.data = sprite_atlas.get(self.sprite_rect, size, rotation)
 
         self.box.size = self.data.get_rect().size
         self.tool = self.data
 
+    def set_frame(self, frame):
+        self.data = frame
+        self.box.size = frame.get_size()
+        self.tool = frame
+
+
+class Scene:
+    # Ordered set of objects split into z-layers; changes made while iterating are applied afterwards.
+    def __init__(self):
+        self.layers = {}
+        self.layer_of = {}
+        self.pending = []
+        self.removed = set()
+        self.iterating = 0
+
+    def __len__(self):
+        return len(self.layer_of) - len(self.removed)
+
+    def __contains__(self, obj):
+        return obj in self.layer_of and obj not in self.removed
+
+    def __iter__(self):
+        self.iterating += 1
+        try:
+            for layer in sorted(self.layers):
+                for obj in self.layers[layer]:
+                    if obj not in self.removed:
+                        yield obj
+        finally:
+            self.iterating -= 1
+            if not self.iterating:
+                self.flush()
+
+    def add(self, obj, layer=0):
+        if self.iterating:
+            self.removed.discard(obj)
+            self.pending.append((self.add, obj, layer))
+            return
+        self.discard(obj)
+        self.layers.setdefault(layer, {})[obj] = None
+        self.layer_of[obj] = layer
+
+    def discard(self, obj):
+        if self.iterating:
+            self.removed.add(obj)
+            self.pending.append((self.discard, obj))
+            return
+        if obj not in self.layer_of:
+            return
+        layer = self.layer_of.pop(obj)
+        del self.layers[layer][obj]
+        if not self.layers[layer]:
+            del self.layers[layer]
+
+    def find(self, kind, **attributes):
+        return [obj for obj in self if isinstance(obj, kind)
+                and all(getattr(obj, name, None) == value for name, value in attributes.items())]
+
+    def flush(self):
+        pending, self.pending = self.pending, []
+        self.removed.clear()
+        for action, *args in pending:
+            action(*args)
+
 
 class Surface(Tool):
     def __init__(self, window, parent, size, position, center='', border=None):
@@ -216,7 +445,10 @@ class Surface(Tool):
         self.surface = pygame.surface.Surface(size)
         self.box.update(position[0], position[1], size[0], size[1])
         self.tool = self.surface
-        self.objects = []
+        self.objects = Scene()
+        self.background = None
+        self.drawn_objects = []
+        self.invalid_rects = []
         if center:
             self.set_center(center)
         if border:
@@ -226,20 +458,59 @@ class Surface(Tool):
         for obj in self.objects:
             obj.event_handler(event)
 
-    def draw(self):
-        self.surface.fill((0, 0, 0))
+    def update(self, dt):
         for obj in self.objects:
-            obj.draw()
+            obj.update(dt)
+
+    def render(self, alpha=1.0):
+        if self.background:
+            self.surface.blit(self.background, (0, 0))
+        else:
+            self.surface.fill((0, 0, 0))
+        self.render_objects(alpha)
+        self.invalid_rects = []
 
         super().draw()
 
-    def add_object(self, obj):
-        self.objects.append(obj)
+    def render_dirty(self, alpha=1.0):
+        erased = self.drawn_objects + self.invalid_rects
+        for rect in erased:
+            self.surface.blit(self.background, rect, rect)
+        profiler.count('blits', len(erased))
+        self.render_objects(alpha)
+        self.invalid_rects = []
+
+        inner = self.box.inflate(-2 * self.border[1], -2 * self.border[1]) if self.border else self.box
+        dirty = []
+        for rect in erased + self.drawn_objects:
+            rect = rect.move(self.box.topleft).clip(inner)
+            if rect.w and rect.h:
+                self.window.blit(self.surface, rect, rect.move(-self.box.x, -self.box.y))
+                dirty.append(rect)
+        profiler.count('blits', len(dirty))
+        return dirty
+
+    def render_objects(self, alpha):
+        self.drawn_objects = []
+        for obj in self.objects:
+            obj.render(alpha)
+            self.drawn_objects.extend(obj.drawn_rects())
+
+    def draw(self):
+        self.render()
+
+    def set_background(self, background):
+        self.background = background
+        self.invalid_rects = [self.surface.get_rect()]
+
+    def refresh(self, rect):
+        self.invalid_rects.append(pygame.rect.Rect(rect))
+
+    def add_object(self, obj, layer=0):
+        self.objects.add(obj, layer)
 
-    def remove_object(self, selected_object):
-        for idx, obj in enumerate(self.objects):
-            if obj == selected_object:
-                del self.objects[idx]
+    def remove_object(self, obj):
+        self.objects.discard(obj)
 
 
 class Shape(Tool):